@@ -28,13 +28,19 @@
 # Authors: E. Castillo (Barcelona Supercomputing Center)
 
 import argparse
+import bisect
+import heapq
+import math
 import os
 import hosts
 import random
-from collections import defaultdict, deque
+from collections import OrderedDict
 
 import core.builder
-from utils.files import read_json
+from core.state import ACTIVE_STATES, StateStore
+from core.runtime import RuntimeModel
+from utils.files import is_under, read_json, scan_tree
+from utils import walltime
 from results.CSVResults import Results
 
 
@@ -49,23 +55,35 @@ class Batcher(object):
     input files after sampling all the possible parameters combinations
     """
 
-    def __init__(self, config):
+    def __init__(self, config, promote=False):
         """
         Args:
             config (config obj) In : Holds the global configuration of Batcher
+            promote (bool) In : let adaptive samplers advance their search, only
+                                launches do it
 
         Attributes:
             config (config obj) : Global configuration of batcher
+            job_builder (JobBuilder) : Parses the experiment files
             experiments (list of Job objects ) : List with all the jobs to launch
             global_desc (list of GDesc objects ) : Files that group other experiment files and
                                           set parameters for csv generation, plotting etc.
         """
         self.config = config
+        self.job_builder = core.builder.JobBuilder(config, promote)
+        self.experiments = None
+        self.global_desc = None
+        self.runtimes = None
+        self.states = {}
 
-        # Parse Json Files
-        job_builder = core.builder.JobBuilder(config)
-        self.experiments = job_builder.build(config.get_args().file)
-        self.global_desc = job_builder.get_global_desc()
+        # Streamed launches build the jobs while they are submitted
+        if not config.get_args().stream:
+            self.__build()
+
+    def __build(self):
+        """ Parse Json Files """
+        self.experiments = self.job_builder.build(self.config.get_args().file)
+        self.global_desc = self.job_builder.get_global_desc()
 
     def run(self):
         """
@@ -80,18 +98,116 @@ class Batcher(object):
         Packing code contributed by LLNL
 
         The current host, as specified in the config.json file will execute the experiments
+        With --max-queued the host keeps at most that many jobs queued, and the launch
+        lasts until the last job is submitted
+
+        Each step is a generator. By default every step processes all the experiments
+        before the next one starts. With --stream the steps are chained lazily, so
+        jobs are submitted while the parameter space is still being sampled and at most
+        --stream-buffer experiments are held for shuffling and packing
         """
-        pack_params = self.config.get_args().pack_params
-        pack_size = self.config.get_args().pack_size
+        args = self.config.get_args()
+        window = args.stream_buffer if args.stream else None
+        if args.runtime_history:
+            self.runtimes = RuntimeModel(args.runtime_history)
 
-        random.shuffle(self.experiments)
+        # A single query of the host tells which past submissions are in flight
+        host = hosts.current_host(self.config)
+        store = self.__open_store(host)
+        store.update(host.get_states(store.active_jobs()))
+        self.states = store.get_states()
 
-        self.__prepare_experiments()
-        self.__remove_executed()
+        if args.stream:
+            jobs = self.job_builder.iter_build(args.file)
+        else:
+            jobs = self.experiments
 
-        jobs = self.__pack_experiments(pack_params, pack_size)
-        for job in jobs:
-            hosts.current_host(self.config).run_job(job)
+        steps = [
+            lambda jobs: self.__shuffle_experiments(jobs, window),
+            self.__prepare_experiments,
+            self.__remove_executed,
+            self.__predict_wall_times,
+            lambda jobs: self.__pack_experiments(
+                jobs,
+                args.pack_params,
+                args.pack_size,
+                args.pack_wall_time,
+                window,
+                host.step_launcher,
+            ),
+            self.__materialize,
+        ]
+        for step in steps:
+            jobs = step(jobs)
+            if not args.stream:
+                jobs = list(jobs)
+
+        if args.max_queued:
+            submissions = host.run_jobs_throttled(
+                jobs, args.max_queued, args.poll_interval
+            )
+        else:
+            submissions = host.run_jobs(jobs)
+
+        submitted = 0
+        for job, job_id in submissions:
+            submitted += 1
+            store.record(job_id, job)
+        print("Submitted %d jobs" % submitted)
+        store.close()
+        if self.runtimes is not None:
+            self.runtimes.save()
+
+    def __open_store(self, host):
+        """
+        Args:
+            host (Host) In : current host
+        Returns:
+            StateStore : the --state-db, or the database of the current host
+        """
+        path = self.config.get_args().state_db
+        if path is None:
+            path = StateStore.default_path(
+                self.config.get_global_config()["host"]["type"], host.get_cluster()
+            )
+        return StateStore(path)
+
+    def status(self):
+        """
+        Prints the state of the experiments in the --file files as recorded
+        in the --state-db, after asking the host about the unfinished jobs
+        """
+        args = self.config.get_args()
+        if self.experiments is None:
+            self.__build()
+
+        host = hosts.current_host(self.config)
+        store = self.__open_store(host)
+        store.update(host.get_states(store.active_jobs()))
+        known = store.get_experiments()
+        store.close()
+
+        counts = OrderedDict()
+        for exp in self.experiments:
+            row = known.get(StateStore.experiment_hash(exp))
+            state = row["state"] if row else "unsubmitted"
+            counts[state] = counts.get(state, 0) + 1
+            if args.status_states and state not in args.status_states:
+                continue
+            row = row or {}
+            print(
+                "%-40s %-12s %-14s %-5s %s"
+                % (
+                    exp.get_name(),
+                    state,
+                    row.get("job_id") or "",
+                    "" if row.get("exit_code") is None else row["exit_code"],
+                    ""
+                    if row.get("runtime") is None
+                    else walltime.to_string(int(row["runtime"])),
+                )
+            )
+        print(", ".join("%d %s" % (count, state) for state, count in counts.items()))
 
     def results(self):
         """ Generates a CSV file with the experiments output as described in the documentation """
@@ -102,25 +218,31 @@ class Batcher(object):
         csv_output = self.config.get_args().csv_output
         csv_extra = self.config.get_args().csv_extra
 
+        if self.experiments is None:
+            self.__build()
+
         # If we have global desc files process them
-        for gdesc in self.global_desc:
-            csv_params = (
-                global_desc["csv_params"] if "csv_params" in global_desc else csv_params
-            )
-            csv_stats = (
-                global_desc["csv_stats"] if "csv_stats" in global_desc else csv_stats
-            )
-            csv_output = (
-                global_desc["csv_output"] if "csv_output" in global_desc else csv_output
-            )
-            csv_query = (
-                global_desc["csv_query"] if "csv_query" in global_desc else csv_query
-            )
-            csv_extra = (
-                global_desc["csv_extra"] if "csv_extra" in global_desc else csv_extra
+        outputs = [
+            (
+                gdesc.exps,
+                gdesc.json.get("csv_params", csv_params),
+                gdesc.json.get("csv_stats", csv_stats),
+                gdesc.json.get("csv_output", csv_output),
             )
+            for gdesc in self.global_desc
+        ]
+        if outputs:
+            # Experiments shared by several gdescs are parsed once
+            parsed = Results(self.config).collect(outputs)
+        for gdesc, (exps, params, stats, output) in zip(self.global_desc, outputs):
             Results(self.config).process(
-                gdesc.experiments, csv_params, csv_stats, csv_query, csv_output
+                exps,
+                params,
+                stats,
+                gdesc.json.get("csv_query", csv_query),
+                gdesc.json.get("csv_extra", csv_extra),
+                output,
+                parsed,
             )
 
         # Only do the whole processing if there is no gdescs
@@ -134,65 +256,317 @@ class Batcher(object):
                 csv_output,
             )
 
-    def __prepare_experiments(self):
+    def __shuffle_experiments(self, jobs, window):
+        """
+        Shuffles the experiments, when a window is given only
+        that many experiments are held to pick the next one from
+
+        Args:
+            jobs (iterable of Job) In : experiments to shuffle
+            window (int) In           : size of the shuffle buffer, None for all
+        """
+        if window is None:
+            # Shuffling a deque in place is quadratic
+            jobs = list(jobs)
+            random.shuffle(jobs)
+            for job in jobs:
+                yield job
+            return
+
+        buf = []
+        for job in jobs:
+            if len(buf) < window:
+                buf.append(job)
+                continue
+            pos = random.randrange(window)
+            yield buf[pos]
+            buf[pos] = job
+        random.shuffle(buf)
+        for job in buf:
+            yield job
+
+    def __prepare_experiments(self, jobs):
         """ Calls the prepare hook in the job module """
-        for exp in self.experiments:
+        for exp in jobs:
             exp.prepare()
+            yield exp
+
+    def __remove_executed(self, jobs):
+        """
+        Remove already executed experiments, and the ones that
+        are queued or running in the host
+
+        The outputs under every OUT_DIR are listed in a single walk
+        the first time one of its experiments is seen, instead of
+        probing the filesystem once per experiment. Working dirs
+        outside of the OUT_DIR are probed
 
-    def __remove_executed(self):
-        """ Remove already executed experiments """
-        self.experiments = filter(lambda x: not x.is_executed(), self.experiments)
+        When predicting wall times, the runtime of the executed
+        experiments is added to the history
+        """
+        index = set()
+        scanned = set()
+        for exp in jobs:
+            out_dir = os.path.expandvars(exp.get_config()["OUT_DIR"])
+            if out_dir not in scanned:
+                scanned.add(out_dir)
+                index |= scan_tree(out_dir, ".out")
+            if self.states.get(StateStore.experiment_hash(exp)) in ACTIVE_STATES:
+                continue
+            # Outputs out of the OUT_DIR are not in the index
+            scanned_out = is_under(exp.get_stdout(), out_dir)
+            if not exp.is_executed(index if scanned_out else None):
+                yield exp
+            elif self.runtimes is not None:
+                self.__learn_runtime(exp)
 
-    def __pack_experiments(self, pack_params, pack_size):
+    def __learn_runtime(self, exp):
+        """ Records the runtime reported by an executed experiment """
+        stat = exp.get_runtime_stat()
+        if stat is None or self.runtimes.knows(exp):
+            return
+        # Only the runtime stat is read
+        stats = self.config.get_model("stats").Stats(exp, names=[stat])
+        seconds = stats.get_stat(stat)
+        if seconds:
+            self.runtimes.record(exp, seconds)
+
+    def __predict_wall_times(self, jobs):
+        """
+        Requests the predicted runtime of the experiments, scaled by
+        --runtime-safety, instead of their wall_time field. Experiments
+        without history keep their wall_time
+        """
+        safety = self.config.get_args().runtime_safety
+        for exp in jobs:
+            if self.runtimes is not None:
+                seconds = self.runtimes.predict(exp)
+                if seconds is not None:
+                    # Round up to minutes
+                    minutes = int(math.ceil(seconds * safety / 60.0))
+                    exp.set_wall_time(walltime.to_string(max(minutes, 1) * 60))
+            yield exp
+
+    def __materialize(self, jobs):
+        """
+        Creates the directories the jobs need right before submitting them,
+        each directory is created once no matter how many jobs share it
+        """
+        created = set()
+        for job in jobs:
+            for path in job.get_required_dirs():
+                if path not in created:
+                    created.add(path)
+                    if not os.path.exists(path):
+                        os.makedirs(path, exist_ok=True)
+            yield job
+
+    def __pack_experiments(
+        self,
+        jobs,
+        pack_params,
+        pack_size,
+        pack_wall_time=None,
+        window=None,
+        launcher=None,
+    ):
         """
         Create Packed jobs were all the experiments within a job
         have the same value for the params specified in pack_params
         and each job has at most pack_size experiments
 
+        When pack_wall_time is given the experiments of each group are
+        bin packed in jobs that last at most that time
+
+        Packs run --pack-width experiments at the same time
+
+        With --pack-nodes the experiments of each group are placed in
+        allocations of that many nodes no matter their node counts
+
         Arguments:
+            jobs (iterable of Job) : experiments to pack
             pack_params (list of str) : name of the params as specified in the params field of the json
             pack_size (int) : maximum number of experiments per job
+            pack_wall_time (str) : maximum wall time of the experiments of a job
+            window (int) : maximum number of experiments waiting for a pack, None for all
+            launcher (str) : step launcher of the host, placing the experiments that
+                             run at the same time on their own nodes
         """
 
-        if (not pack_params) and (not pack_size):
+        args = self.config.get_args()
+        if not (pack_params or pack_size or pack_wall_time or args.pack_nodes):
             # no pack especified
-            return self.experiments
-
-        if pack_params:
-            # Create groups of experiments with that share the same pack_params value
-            parts = self.__group_exps(self.experiments, pack_params)
-            packs = deque([])
-            if pack_size:
-                for part in parts:
-                    packs.extend(
-                        [
-                            part[i : i + pack_size]
-                            for i in range(0, len(part), pack_size)
-                        ]
-                    )
-        elif pack_size:
-            packs = [
-                self.experiments[i : i + pack_size]
-                for i in range(0, len(self.experiments), pack_size)
-            ]
-
-        return [
-            self.config.get_job_model().PackedJob(i, pack)
-            for i, pack in enumerate(packs)
-        ]
+            for job in jobs:
+                yield job
+            return
+
+        margin = args.pack_margin
+        width = args.pack_width
+        capacity = None
+        if pack_wall_time:
+            # Leave room for the margin so the job request fits the wall time
+            capacity = int(walltime.to_seconds(pack_wall_time) / (1 + margin))
+
+        if args.pack_nodes:
+            parts = self.__group_exps(jobs, pack_params or [], None, window)
+            packs = (
+                pack
+                for part in parts
+                for pack in self.__shelf_pack(
+                    part, args.pack_nodes, capacity, pack_size
+                )
+            )
+        elif pack_wall_time:
+            # Group sizes are limited by the bin packing
+            parts = self.__group_exps(jobs, pack_params or [], None, window)
+            packs = (
+                pack
+                for part in parts
+                for pack in self.__bin_pack(part, capacity, pack_size, width)
+            )
+        else:
+            packs = self.__group_exps(jobs, pack_params or [], pack_size, window)
+
+        for pack_id, pack in enumerate(packs):
+            # When streaming the model is loaded with the first experiment
+            model = self.config.get_job_model()
+            if args.pack_nodes:
+                yield model.ShelfPackedJob(pack_id, pack, margin, launcher)
+            else:
+                yield model.PackedJob(pack_id, pack, margin, width, launcher)
 
-    def __group_exps(self, jobs, params):
+    def __bin_pack(self, jobs, capacity, pack_size=None, width=1):
         """
-        Create sub list of experiments grouped by the params list values
+        Best fit decreasing packing of the experiments in bins of width
+        lanes, each lane lasting at most capacity. Experiments longer
+        than capacity get a bin of their own
+
+        Experiments go to the least loaded lane of their bin, which is
+        the lane a concurrent pack launches them on, as packs launch
+        their experiments longest first
+
+        Arguments:
+            jobs (list of Job) : experiments to pack
+            capacity (int) : seconds available per lane
+            pack_size (int) : maximum number of experiments per bin
+            width (int) : lanes per bin
+        Returns:
+            list of list of Job : the bins
+        """
+        bins = []
+        # Busy seconds of the lanes of every bin
+        lanes = []
+        # (free seconds of the least loaded lane, bin index) of the bins that can still grow
+        free = []
+        times = [walltime.to_seconds(job.get_wall_time()) for job in jobs]
+        for i in sorted(range(len(jobs)), key=lambda i: times[i], reverse=True):
+            pos = bisect.bisect_left(free, (times[i], -1))
+            if pos < len(free):
+                b = free.pop(pos)[1]
+            else:
+                b = len(bins)
+                bins.append([])
+                lanes.append([0] * width)
+            bins[b].append(jobs[i])
+            heapq.heapreplace(lanes[b], lanes[b][0] + times[i])
+            left = capacity - lanes[b][0]
+            if left > 0 and (not pack_size or len(bins[b]) < pack_size):
+                bisect.insort(free, (left, b))
+        return bins
+
+    def __shelf_pack(self, jobs, nodes, capacity=None, pack_size=None):
         """
-        parts = []
-        if not len(params):
-            return [jobs]
+        First fit decreasing height packing of the experiments in allocations
+        of nodes x capacity. Allocations are split in shelves of experiments
+        running side by side, the longest experiments are placed first so they
+        set the length of their shelf. Experiments needing more nodes than the
+        allocation get one of their own
 
-        partition = defaultdict(list)
+        Arguments:
+            jobs (list of Job) : experiments to pack
+            nodes (int) : nodes of every allocation
+            capacity (int) : seconds available per allocation, None for no limit
+            pack_size (int) : maximum number of experiments per allocation
+        Returns:
+            list of list of list of Job : the shelves of every allocation
+        """
+        bins = []
+        # Seconds taken by the shelves and experiments of every allocation
+        heights = []
+        sizes = []
+        # Allocations that can take more shelves
+        open_bins = []
+        # [free nodes, allocation, shelf] of the shelves with free nodes
+        shelves = []
+        times = [walltime.to_seconds(job.get_wall_time()) for job in jobs]
+        order = sorted(
+            range(len(jobs)), key=lambda i: (times[i], jobs[i].get_nodes()), reverse=True
+        )
+        for i in order:
+            need = jobs[i].get_nodes()
+            pos = next(
+                (
+                    pos
+                    for pos, shelf in enumerate(shelves)
+                    if shelf[0] >= need and (not pack_size or sizes[shelf[1]] < pack_size)
+                ),
+                None,
+            )
+            if pos is not None:
+                shelf = shelves[pos]
+            else:
+                b = next(
+                    (
+                        b
+                        for b in open_bins
+                        if need <= nodes
+                        and (capacity is None or heights[b] + times[i] <= capacity)
+                        and (not pack_size or sizes[b] < pack_size)
+                    ),
+                    None,
+                )
+                if b is None:
+                    b = len(bins)
+                    bins.append([])
+                    heights.append(0)
+                    sizes.append(0)
+                    if need <= nodes:
+                        open_bins.append(b)
+                shelf = [nodes, b, []]
+                bins[b].append(shelf[2])
+                heights[b] += times[i]
+                pos = len(shelves)
+                shelves.append(shelf)
+            shelf[0] -= need
+            shelf[2].append(jobs[i])
+            sizes[shelf[1]] += 1
+            if shelf[0] <= 0:
+                del shelves[pos]
+        return bins
+
+    def __group_exps(self, jobs, params, pack_size, window):
+        """
+        Create sub list of experiments grouped by the params list values
+
+        Groups are emitted once they reach pack_size experiments, or when
+        more than window experiments are waiting, and at the end
+        """
+        partition = OrderedDict()
+        waiting = 0
         for job in jobs:
-            partition[job.get_param(params[0])].append(job)
+            key = tuple(job.get_param(param) for param in params)
+            part = partition.setdefault(key, [])
+            part.append(job)
+            waiting += 1
+            if pack_size and len(part) == pack_size:
+                waiting -= len(partition.pop(key))
+                yield part
+            elif window and waiting >= window:
+                for part in partition.values():
+                    yield part
+                partition.clear()
+                waiting = 0
 
-        for key in partition:
-            parts += self.__group_exps(partition[key], params[1:])
-        return parts
+        for part in partition.values():
+            for i in range(0, len(part), pack_size or len(part)):
+                yield part[i : i + (pack_size or len(part))]
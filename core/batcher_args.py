@@ -105,6 +105,101 @@ class BatcherArgs:
             default=None,
         )
 
+        parser.add_argument(
+            "-pw",
+            "--pack-wall-time",
+            type=str,
+            help="Bin pack experiments in jobs lasting at most this time (HH:MM:SS)",
+            required=False,
+            default=None,
+        )
+
+        parser.add_argument(
+            "--pack-margin",
+            type=float,
+            help="Fraction of the packed wall time added to the jobs request",
+            required=False,
+            default=0.1,
+        )
+
+        parser.add_argument(
+            "--pack-width",
+            type=int,
+            help="Experiments of a pack running at the same time, the job requests this many times their nodes",
+            required=False,
+            default=1,
+        )
+
+        parser.add_argument(
+            "--pack-nodes",
+            type=int,
+            help="Nodes of the jobs packing experiments with different node counts side by side",
+            required=False,
+            default=None,
+        )
+
+        parser.add_argument(
+            "--runtime-history",
+            type=str,
+            help="File with the runtimes of past experiments, used to predict the wall times",
+            required=False,
+            default=None,
+        )
+
+        parser.add_argument(
+            "--runtime-safety",
+            type=float,
+            help="Factor applied to the predicted runtimes when requesting wall times",
+            required=False,
+            default=1.5,
+        )
+
+        parser.add_argument(
+            "--state-db",
+            type=str,
+            help="SQLite database with the state of the launched experiments, one per host type and cluster in ~/.tizona by default",
+            required=False,
+            default=None,
+        )
+
+        parser.add_argument(
+            "--max-queued",
+            type=int,
+            help="Maximum number of jobs queued in the host, the launch waits for them to finish to submit more",
+            required=False,
+            default=None,
+        )
+
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            help="Seconds between polls of the host queue when --max-queued is reached",
+            required=False,
+            default=60,
+        )
+
+        parser.add_argument(
+            "--stream",
+            help="Submit jobs while the experiments are being sampled",
+            required=False,
+            action="store_true",
+        )
+
+        parser.add_argument(
+            "--stream-buffer",
+            type=int,
+            help="Experiments held for shuffling and packing when streaming",
+            required=False,
+            default=1000,
+        )
+
+        parser.add_argument(
+            "--promote",
+            help="Let adaptive samplers start their next round before launching",
+            required=False,
+            action="store_true",
+        )
+
         self.parser = parser
 
     def parse_args(self):
@@ -28,7 +28,7 @@
 # Authors: E. Castillo (Barcelona Supercomputing Center)
 
 from collections import deque
-from core.samplers import GridSampler
+from core.samplers import get_sampler
 from utils.files import read_json
 
 
@@ -57,16 +57,21 @@ class JobBuilder(object):
     create the needed Job objects of the corresponding module.
     """
 
-    def __init__(self, config):
+    def __init__(self, config, promote=False):
         """
         Attributes :
             config (config obj) : Contains batcher global config
+            promote (bool) : let adaptive samplers advance before sampling
             experiments (list of Job)   : Holds all the jobs
             global_desc (list of GDesc) : Holds all the global description files
+            parsed_files (dict) : file -> jobs, so files referenced by several
+                                  global descriptions are sampled once
         """
         self.config = config
         self.experiments = deque([])
         self.global_desc = deque([])
+        self.parsed_files = {}
+        self.promote = promote
 
     def build(self, files):
         """
@@ -79,6 +84,29 @@ class JobBuilder(object):
             self.__parse_exp_files(files)
         return self.experiments
 
+    def iter_build(self, files):
+        """
+        Lazily reads the files and samples their experiments,
+        jobs are built as they are requested
+
+        Global description files are followed but not tracked,
+        they only matter when collecting results
+
+        Args:
+            files (list of str) In : files to read the experiments from
+        Yields:
+            Job objects
+        """
+        for json_file_path in files:
+            print("Reading ", json_file_path)
+            exp_json = read_json(json_file_path)
+            if "sim_files" in exp_json:
+                for job in self.iter_build(exp_json["sim_files"]):
+                    yield job
+            else:
+                for job in self.__get_sampler(exp_json).iter_build():
+                    yield job
+
     def get_global_desc(self):
         """ Returns the list of global description files """
         return self.global_desc
@@ -88,10 +116,19 @@ class JobBuilder(object):
         Reads all the json files and populates the self.experiments list
         with Job objects
 
+        A file read before, as when several global descriptions share
+        it, gives the same jobs it gave the first time
+
         Args:
             files (list of str) In : files to read the experiments from
+        Returns:
+            list of Job : the jobs of the files
         """
+        jobs = []
         for json_file_path in files:
+            if json_file_path in self.parsed_files:
+                jobs.extend(self.parsed_files[json_file_path])
+                continue
             print("Reading ", json_file_path)
             exp_json = read_json(json_file_path)
             # This is a global exps json
@@ -102,7 +139,10 @@ class JobBuilder(object):
                 if exps:
                     self.global_desc.append(GlobDesc(exp_json, exps))
             else:
-                self.__configure_experiment(exp_json)
+                exps = self.__configure_experiment(exp_json)
+            self.parsed_files[json_file_path] = exps
+            jobs.extend(exps)
+        return jobs
 
     def __configure_experiment(self, json):
         """
@@ -112,12 +152,23 @@ class JobBuilder(object):
         Args:
            json (dict) In : one of the files specified in --files cmd arg already parsed as a json file
         """
+        exps = self.__get_sampler(json).build()
+        self.experiments.extend(exps)
+        return exps
+
+    def __get_sampler(self, json):
+        """
+        Args:
+           json (dict) In : experiment file already parsed
+        Returns:
+           Sampler : sampler of the experiment parameters
+        """
         # The load model will process the parameters and
         # tune the json dict accordingly
         job_module = self.config.load_model(json, json["model"])
-        sampler = GridSampler(
+        sampler = get_sampler(json)(
             json, job_module, self.config.get_module_config(json["model"])
         )
-        exps = sampler.build()
-        self.experiments.extend(exps)
-        return exps
+        if self.promote:
+            sampler.promote()
+        return sampler
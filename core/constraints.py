@@ -0,0 +1,122 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+
+class Constraints(object):
+    """
+    Python expressions over the params that every valid combination
+    must satisfy, as written in the "constraints" list of the experiment json
+
+        "constraints" : ["ranks <= nodes * 48", "size_X >= size_Y"]
+
+    Each constraint is assigned to the level of the last param it uses,
+    so a sampler assigning params in order can check it as soon as all
+    its params have a value and prune the remaining combinations
+    """
+
+    # Names besides the params an expression can use
+    builtins = {
+        "abs": abs,
+        "all": all,
+        "any": any,
+        "float": float,
+        "int": int,
+        "len": len,
+        "max": max,
+        "min": min,
+        "round": round,
+        "str": str,
+    }
+
+    def __init__(self, expressions, params):
+        """
+        Args:
+            expressions (list of str) In : constraints of the experiment
+            params (list of str) In      : params in the order they are assigned
+        Attributes:
+            levels (list of list) : compiled constraints that can be checked once
+                                    the first i params have a value
+        """
+        self.levels = [[] for _ in range(len(params) + 1)]
+        for expression in expressions:
+            code = compile(expression, "<constraint>", "eval")
+            # Names that are not params are builtins or attributes
+            used = [params.index(name) + 1 for name in self.__names(code) if name in params]
+            self.levels[max(used) if used else 0].append(code)
+
+    def __names(self, code):
+        """
+        Args:
+            code (code) In : compiled constraint
+        Returns:
+            set : names used by the expression, including the ones inside
+                  generator expressions and comprehensions
+        """
+        names = set(code.co_names)
+        for const in code.co_consts:
+            if isinstance(const, type(code)):
+                names.update(self.__names(const))
+        return names
+
+    def last_level(self):
+        """
+        Returns:
+            int : the deepest level with constraints, params after it are unconstrained
+        """
+        for level in range(len(self.levels) - 1, -1, -1):
+            if self.levels[level]:
+                return level
+        return 0
+
+    def check(self, sample, level):
+        """
+        Args:
+            sample (dict) In : values of at least the first level params
+            level (int) In   : number of params that were just assigned
+        Returns:
+            bool : False when a constraint of that level is violated
+        """
+        if not self.levels[level]:
+            return True
+        # The params are globals so nested scopes like generator expressions see them
+        scope = dict(sample)
+        scope["__builtins__"] = self.builtins
+        for code in self.levels[level]:
+            if not eval(code, scope):
+                return False
+        return True
+
+    def is_valid(self, sample):
+        """
+        Args:
+            sample (dict) In : values of all the params
+        Returns:
+            bool : True when the sample satisfies all the constraints
+        """
+        return all(self.check(sample, level) for level in range(len(self.levels)))
@@ -0,0 +1,212 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import hashlib
+import json
+import math
+import os
+import statistics
+
+import numpy as np
+
+
+class RuntimeModel(object):
+    """
+    Predicts how long experiments last from the measured runtime of past ones
+
+    Experiments are grouped by model and bin, so only runs of the same
+    command predict each other. The runtime of an experiment is:
+
+    1. The median of the runs with the same params
+    2. A power law regression over the numeric params, fitted with the runs
+       that share the rest of params, log(t) = b0 + sum(bi * log(param i))
+    3. When there are not enough runs for the regression, the distance weighted
+       average of the nearest runs, where numeric params are compared relative
+       to the range they span and any other param counts as equal or different
+
+    The history is stored as a json file keyed by the stdout of each run
+    """
+
+    def __init__(self, path, neighbours=3):
+        """
+        Args / Attributes:
+            path (str)       : json file holding the history
+            neighbours (int) : runs averaged when there is no exact match
+        Attributes:
+            history (dict) : stdout -> {"group", "params", "seconds"}
+            groups (dict)  : group -> list of (params, seconds), built by fit
+                             and kept up to date by record
+        """
+        self.path = os.path.expandvars(os.path.expanduser(path))
+        self.neighbours = neighbours
+        self.history = {}
+        self.groups = None
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                self.history = json.load(f)
+
+    @staticmethod
+    def group(job):
+        """
+        Returns:
+            str : identifier of the model and command line of the job
+        """
+        experiment = job.experiment
+        key = json.dumps([experiment["model"], experiment["bin"]], sort_keys=True)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def knows(self, job):
+        """
+        Returns:
+            bool : True when the runtime of the job is already recorded
+        """
+        return job.get_stdout() in self.history
+
+    def record(self, job, seconds):
+        """
+        Args:
+            job (Job) In       : executed experiment
+            seconds (float) In : its measured runtime
+        """
+        replaced = job.get_stdout() in self.history
+        run = {
+            "group": self.group(job),
+            "params": json.loads(json.dumps(job.param_sample, default=str)),
+            "seconds": seconds,
+        }
+        self.history[job.get_stdout()] = run
+        if replaced:
+            # The old run is somewhere in its group
+            self.groups = None
+        elif self.groups is not None:
+            self.groups.setdefault(run["group"], []).append(
+                (run["params"], run["seconds"])
+            )
+
+    def fit(self):
+        """ Indexes the history by group """
+        self.groups = {}
+        for run in self.history.values():
+            self.groups.setdefault(run["group"], []).append(
+                (run["params"], run["seconds"])
+            )
+
+    def predict(self, job):
+        """
+        Returns:
+            float : predicted runtime in seconds, None without history for its group
+        """
+        if self.groups is None:
+            self.fit()
+        runs = self.groups.get(self.group(job))
+        if not runs:
+            return None
+
+        params = json.loads(json.dumps(job.param_sample, default=str))
+        exact = [seconds for run, seconds in runs if run == params]
+        if exact:
+            return statistics.median(exact)
+
+        seconds = self.__regression(runs, params)
+        if seconds is not None:
+            return seconds
+        return self.__nearest(runs, params)
+
+    def __regression(self, runs, params):
+        """
+        Returns:
+            float : runtime predicted by the power law fitted with the runs that
+                    share the non numeric params, None without enough of them
+        """
+        numeric = [
+            name
+            for name in params
+            if self.__is_number(params[name]) and params[name] > 0
+        ]
+        similar = [
+            (run, seconds)
+            for run, seconds in runs
+            if all(run.get(name) == params[name] for name in params if name not in numeric)
+            and all(self.__is_number(run.get(name)) and run[name] > 0 for name in numeric)
+        ]
+        # Only params that change between runs can be fitted
+        features = [
+            name for name in numeric if len(set(run[name] for run, _ in similar)) > 1
+        ]
+        if not features or len(similar) <= len(features) + 1:
+            return None
+
+        a = np.array(
+            [[1.0] + [math.log(run[name]) for name in features] for run, _ in similar]
+        )
+        b = np.log([max(seconds, 1e-3) for _, seconds in similar])
+        coefs = np.linalg.lstsq(a, b, rcond=None)[0]
+        x = np.array([1.0] + [math.log(params[name]) for name in features])
+        return float(np.exp(x.dot(coefs)))
+
+    def __nearest(self, runs, params):
+        """
+        Returns:
+            float : distance weighted average runtime of the nearest runs
+        """
+        spans = {}
+        for name in params:
+            values = [run.get(name) for run, _ in runs] + [params[name]]
+            if all(self.__is_number(value) for value in values):
+                spans[name] = (max(values) - min(values)) or 1
+
+        def distance(run):
+            dist = 0.0
+            for name in params:
+                if name in spans:
+                    dist += abs(run[name] - params[name]) / float(spans[name])
+                elif run.get(name) != params[name]:
+                    dist += 1
+            return dist
+
+        nearest = sorted((distance(run), seconds) for run, seconds in runs)
+        nearest = nearest[: self.neighbours]
+        weights = [1.0 / (dist + 1e-6) for dist, _ in nearest]
+        return sum(w * seconds for w, (_, seconds) in zip(weights, nearest)) / sum(
+            weights
+        )
+
+    @staticmethod
+    def __is_number(value):
+        return type(value) in (int, float)
+
+    def save(self):
+        """ Writes the history """
+        history_dir = os.path.dirname(self.path)
+        if history_dir and not os.path.exists(history_dir):
+            os.makedirs(history_dir)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.history, f)
+        os.replace(tmp_path, self.path)
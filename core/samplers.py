@@ -27,9 +27,34 @@
 #
 # Authors: E. Castillo (Barcelona Supercomputing Center)
 
+import inspect
 import itertools
+import json
+import os
+import random
 
 from collections import defaultdict, deque
+from core.constraints import Constraints
+from utils import loaders
+
+
+class UnknownSampler(Exception):
+    pass
+
+
+def get_sampler(experiment):
+    """
+    Args:
+        experiment (dict) In : experiment json, the "type" of its "sampler"
+                               section names the Sampler class to use
+    Returns:
+        Sampler class : GridSampler when the experiment does not choose one
+    """
+    name = experiment.get("sampler", {}).get("type", "GridSampler")
+    sampler = globals().get(name)
+    if not (inspect.isclass(sampler) and issubclass(sampler, Sampler)):
+        raise UnknownSampler("Unknown sampler %s" % name)
+    return sampler
 
 
 class Sampler(object):
@@ -52,6 +77,13 @@ class Sampler(object):
         self.job_module = job_module
         self.job_module_config = job_module_config
 
+    def promote(self):
+        """
+        Advances adaptive searches to their next step, only launches do it
+        so building the experiments never changes the search state
+        """
+        pass
+
     def sample(self):
         """
         Get one combination of all the experiment[params] dict possible ones
@@ -66,14 +98,22 @@ class Sampler(object):
         Returns:
            list of module.Job objects
         """
+        self.jobs.extend(self.iter_build())
+        return self.jobs
+
+    def iter_build(self):
+        """
+        Lazily sample the combinations and build their Job objects
+
+        Yields:
+           module.Job objects
+        """
         job_id = 0
         for param_set in self.sample():
-            self.jobs.extend(
-                self.job_module.job_factory(
-                    self.experiment, param_set, job_id, self.job_module_config
-                )
-            )
-        return self.jobs
+            for job in self.job_module.job_factory(
+                self.experiment, param_set, job_id, self.job_module_config
+            ):
+                yield job
 
 
 class GridSampler(Sampler):
@@ -82,6 +122,10 @@ class GridSampler(Sampler):
     It will do a combinatory search of all the params
     defined as an array in the params section of the experiments
     json
+
+    Combinations violating the experiment constraints are pruned while
+    they are enumerated, a param value that breaks a constraint discards
+    all the combinations of the params that follow it
     """
 
     def __init__(self, experiment, args, job_module_config):
@@ -93,8 +137,345 @@ class GridSampler(Sampler):
             if type(experiment["params"][param]) is not list:
                 experiment["params"][param] = [experiment["params"][param]]
         inputs = experiment["params"]
+        names = list(inputs.keys())
+        self.constraints = Constraints(experiment.get("constraints", []), names)
+
+        if not self.constraints.check({}, 0):
+            self.searcher = iter([])
+        else:
+            self.searcher = self.__search(inputs, names, {}, 0)
+
+    def __search(self, inputs, names, sample, level):
+        """
+        Assigns the params in order checking the constraints of each level,
+        the params after the last constrained one are a plain product
+
+        Args:
+            inputs (dict) In    : list of values of every param
+            names (list) In     : params in assignment order
+            sample (dict) InOut : values of the params already assigned
+            level (int) In      : number of params already assigned
+        Yields:
+            dict : valid combinations of all the params
+        """
+        if level >= self.constraints.last_level():
+            tail = names[level:]
+            for values in itertools.product(*[inputs[name] for name in tail]):
+                param_set = dict(sample)
+                param_set.update(zip(tail, values))
+                yield param_set
+            return
+
+        name = names[level]
+        for value in inputs[name]:
+            sample[name] = value
+            if self.constraints.check(sample, level + 1):
+                for param_set in self.__search(inputs, names, sample, level + 1):
+                    yield param_set
+        # Params with an empty list of values were never assigned
+        sample.pop(name, None)
+
+
+class BudgetSampler(Sampler):
+    """
+    Base class for samplers that only visit a budget of the combinations
+    of the params lists. They are configured in the sampler section of
+    the experiments json:
+
+        "sampler" : {"type" : "LatinHypercubeSampler", "budget" : 200, "seed" : 7}
+
+    Subclasses generate points as tuples with the index of the value of each
+    param. Repeated points and points violating the constraints are skipped
+    until budget combinations are found, the same seed gives the same combinations
+    """
+
+    def __init__(self, experiment, job_module, job_module_config):
+        Sampler.__init__(self, experiment, job_module, job_module_config)
+        for param in experiment["params"]:
+            if type(experiment["params"][param]) is not list:
+                experiment["params"][param] = [experiment["params"][param]]
+
+        settings = experiment.get("sampler", {})
+        self.inputs = experiment["params"]
+        self.names = list(self.inputs.keys())
+        self.sizes = [len(self.inputs[name]) for name in self.names]
+        self.budget = settings.get("budget", 100)
+        # Give up when the constraints reject almost every point
+        self.max_draws = settings.get("max_draws", 100 * self.budget)
+        self.random = random.Random(settings.get("seed", 0))
+        self.constraints = Constraints(experiment.get("constraints", []), self.names)
+        self.searcher = self.select()
+
+    def points(self):
+        """
+        Yields:
+            tuple of int : index of the value of every param
+        """
+        raise NotImplementedError
+
+    def select(self):
+        """
+        Yields:
+            dict : up to budget distinct valid combinations
+        """
+        total = 1
+        for size in self.sizes:
+            total *= size
+        points = self.points()
+        if self.budget >= total:
+            # The budget covers the whole space
+            points = itertools.product(*[range(size) for size in self.sizes])
+
+        seen = set()
+        found = 0
+        for draws, point in enumerate(points):
+            if found >= self.budget or len(seen) >= total or draws >= self.max_draws:
+                return
+            if point in seen:
+                continue
+            seen.add(point)
+            param_set = dict(
+                (name, self.inputs[name][i]) for name, i in zip(self.names, point)
+            )
+            if self.constraints.is_valid(param_set):
+                found += 1
+                yield param_set
+
+
+class RandomSampler(BudgetSampler):
+    """
+    Picks combinations uniformly at random
+    """
+
+    def points(self):
+        while True:
+            yield tuple(self.random.randrange(size) for size in self.sizes)
+
 
-        self.searcher = (
-            dict(zip(inputs.keys(), values))
-            for values in itertools.product(*inputs.values())
+class LatinHypercubeSampler(BudgetSampler):
+    """
+    Latin hypercube designs of budget points, every param has its values
+    range split in budget strata and each stratum is sampled exactly once.
+    Further designs are drawn if repeated or invalid points leave the
+    budget unfilled
+    """
+
+    def points(self):
+        while True:
+            strata = []
+            for size in self.sizes:
+                perm = list(range(self.budget))
+                self.random.shuffle(perm)
+                strata.append(perm)
+            for i in range(self.budget):
+                yield tuple(
+                    int((perm[i] + self.random.random()) * size / self.budget)
+                    for perm, size in zip(strata, self.sizes)
+                )
+
+
+class HaltonSampler(BudgetSampler):
+    """
+    Low discrepancy sequence with one prime base per param, the seed
+    shifts the sequence (Cranley-Patterson rotation) to get
+    different coverages of the space
+    """
+
+    def points(self):
+        bases = []
+        candidate = 2
+        while len(bases) < len(self.sizes):
+            if all(candidate % prime for prime in bases):
+                bases.append(candidate)
+            candidate += 1
+        shifts = [self.random.random() for _ in self.sizes]
+
+        n = 1
+        while True:
+            point = []
+            for base, shift, size in zip(bases, shifts, self.sizes):
+                # Radical inverse of n in base
+                value, fraction, i = 0.0, 1.0 / base, n
+                while i:
+                    value += (i % base) * fraction
+                    i //= base
+                    fraction /= base
+                point.append(int(((value + shift) % 1.0) * size))
+            yield tuple(point)
+            n += 1
+
+
+class FractionalFactorialSampler(BudgetSampler):
+    """
+    Two level fractional factorial design. Every param with several values
+    is a factor whose low and high levels are its first and last values.
+
+    The budget is rounded down to a power of two 2^r: the first r factors
+    form a full factorial and each of the others is aliased with the
+    interaction of a subset of them, using the largest subsets first to
+    keep the design resolution as high as possible
+    """
+
+    def points(self):
+        factors = [i for i, size in enumerate(self.sizes) if size > 1]
+        runs = 2
+        while runs * 2 <= min(self.budget, 2 ** len(factors)):
+            runs *= 2
+        base = runs.bit_length() - 1
+        if not factors:
+            base = 0
+
+        interactions = [
+            subset
+            for order in range(base, 1, -1)
+            for subset in itertools.combinations(range(base), order)
+        ]
+        generated = len(factors) - base
+        if generated > len(interactions):
+            raise ValueError(
+                "%d runs can not alias %d factors, increase the budget"
+                % (2 ** base, len(factors))
+            )
+
+        for run in range(2 ** base):
+            levels = [(run >> bit) & 1 for bit in range(base)]
+            for subset in interactions[:generated]:
+                levels.append(sum(levels[bit] for bit in subset) % 2)
+            point = [0] * len(self.sizes)
+            for factor, level in zip(factors, levels):
+                point[factor] = level * (self.sizes[factor] - 1)
+            yield tuple(point)
+
+
+class SuccessiveHalvingSampler(BudgetSampler):
+    """
+    Iterative search that spends little on bad configurations.
+
+    The first round runs budget random configurations giving min_resource to the
+    resource param. Once all of them report the metric stat, the best 1/eta
+    are promoted to a round with eta times more resource, until max_resource
+    is reached:
+
+        "sampler" : {"type"         : "SuccessiveHalvingSampler",
+                     "budget"       : 27,
+                     "resource"     : "iters",
+                     "min_resource" : 10,
+                     "max_resource" : 270,
+                     "eta"          : 3,
+                     "metric"       : "time",
+                     "goal"         : "min",
+                     "state"        : "$HOME/halving_state.json",
+                     "seed"         : 0}
+
+    The rounds are stored in the state file, so every launch with --promote resumes
+    the search, other uses only read it. All the rounds are sampled each time, the executed ones are not relaunched
+    and their results can still be collected. The resource param must be part
+    of the experiment name and working_dir to keep the rounds apart
+    """
+
+    def __init__(self, experiment, job_module, job_module_config):
+        settings = experiment["sampler"]
+        self.resource = settings["resource"]
+        # The resource is not a searched param, each round sets it
+        experiment["params"].pop(self.resource, None)
+        BudgetSampler.__init__(self, experiment, job_module, job_module_config)
+
+        self.min_resource = settings["min_resource"]
+        self.max_resource = settings["max_resource"]
+        self.eta = settings.get("eta", 3)
+        self.metric = settings["metric"]
+        self.goal = settings.get("goal", "min")
+        self.state_path = os.path.expandvars(os.path.expanduser(settings["state"]))
+        if self.goal not in ("min", "max"):
+            raise ValueError("Unknown goal %s, use min or max" % self.goal)
+        self.searcher = self.__rounds()
+
+    def points(self):
+        while True:
+            yield tuple(self.random.randrange(size) for size in self.sizes)
+
+    def get_resource(self, level):
+        """
+        Returns:
+            resource given to the configurations of a round
+        """
+        return min(self.min_resource * self.eta ** level, self.max_resource)
+
+    def __score(self, param_set):
+        """
+        Returns:
+            float : average metric of the jobs of a configuration, None
+                    while any of them has not reported it
+        """
+        stats_module = loaders.load_module(
+            self.job_module.__name__.rsplit(".", 1)[0] + ".stats"
         )
+        values = []
+        for job in self.job_module.job_factory(
+            self.experiment, param_set, 0, self.job_module_config
+        ):
+            value = None
+            if job.is_executed():
+                value = stats_module.Stats(job).get_stat(self.metric)
+            if value is None:
+                return None
+            values.append(value)
+        return sum(values) / len(values)
+
+    def __load(self):
+        """
+        Returns:
+            list of list of dict : configurations of each round, the first
+                                   round is sampled when there is no state yet
+        """
+        if os.path.isfile(self.state_path):
+            with open(self.state_path, "r") as f:
+                return json.load(f)["rounds"]
+        # The same seed always gives the same first round
+        self.random.seed(self.experiment["sampler"].get("seed", 0))
+        return [list(self.select())]
+
+    def __save(self, rounds):
+        state_dir = os.path.dirname(self.state_path)
+        if state_dir and not os.path.exists(state_dir):
+            os.makedirs(state_dir)
+        with open(self.state_path, "w") as f:
+            json.dump({"rounds": rounds}, f, indent=1)
+
+    def promote(self):
+        """
+        Adds new rounds while the last one is complete and stores them in the state file
+        """
+        rounds = self.__load()
+        while self.get_resource(len(rounds) - 1) < self.max_resource:
+            level = len(rounds) - 1
+            configs = rounds[level]
+            if len(configs) <= 1:
+                break
+            scores = []
+            for config in configs:
+                param_set = dict(config)
+                param_set[self.resource] = self.get_resource(level)
+                scores.append(self.__score(param_set))
+            if any(score is None for score in scores):
+                # The round is still running
+                break
+            ranking = sorted(
+                range(len(configs)),
+                key=lambda i: scores[i],
+                reverse=self.goal == "max",
+            )
+            keep = max(1, len(configs) // self.eta)
+            rounds.append([configs[i] for i in sorted(ranking[:keep])])
+        self.__save(rounds)
+
+    def __rounds(self):
+        """
+        Yields:
+            dict : the configurations of every round with their resource
+        """
+        for level, configs in enumerate(self.__load()):
+            for config in configs:
+                param_set = dict(config)
+                param_set[self.resource] = self.get_resource(level)
+                yield param_set
@@ -0,0 +1,221 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# States of the experiments whose job has not finished
+ACTIVE_STATES = (
+    "submitted",
+    "queued",
+    "pending",
+    "running",
+    "requeued",
+    "suspended",
+    "completing",
+    "configuring",
+    "resizing",
+    "preempted",
+)
+
+schema = """
+CREATE TABLE IF NOT EXISTS experiments (
+    hash TEXT PRIMARY KEY,
+    name TEXT,
+    stdout TEXT,
+    job_id TEXT,
+    pack TEXT,
+    state TEXT,
+    submitted REAL,
+    updated REAL,
+    exit_code INTEGER,
+    runtime REAL
+);
+CREATE INDEX IF NOT EXISTS experiments_job_id ON experiments (job_id);
+CREATE INDEX IF NOT EXISTS experiments_state ON experiments (state);
+CREATE TABLE IF NOT EXISTS transitions (
+    hash TEXT,
+    state TEXT,
+    time REAL
+);
+"""
+
+
+class StateStore(object):
+    """
+    SQLite database remembering the experiments launched, the job
+    that runs them and the states that job went through
+
+    Experiments are identified by a hash of their model, bin, env
+    and params, so they are the same experiment no matter the
+    launch or the order they are sampled in. Every submission is
+    committed at once, so an interrupted launch knows what was
+    already submitted when resumed
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str) : database file
+        Attributes:
+            path (str) : database file with the variables expanded
+            db (sqlite3.Connection) : connection to the database
+        """
+        self.path = os.path.expandvars(os.path.expanduser(path))
+        db_dir = os.path.dirname(self.path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript(schema)
+
+    @staticmethod
+    def default_path(host_type, cluster):
+        """
+        Job ids are only meaningful in the host that gave them, so every
+        host type and cluster keeps its own database
+
+        Args:
+            host_type (str) In : type of the host in the config.json
+            cluster (str) In   : name of the cluster, as given by the host
+        Returns:
+            str : path to the database of the host
+        """
+        return os.path.join("~", ".tizona", "state-%s-%s.db" % (host_type, cluster))
+
+    @staticmethod
+    def experiment_hash(job):
+        """
+        Returns:
+            str : identifier of the model, bin, env and params of the experiment
+        """
+        experiment = job.experiment
+        key = json.dumps(
+            [
+                experiment["model"],
+                experiment["bin"],
+                experiment.get("env", ""),
+                job.param_sample,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def record(self, job_id, job):
+        """
+        Records the experiments of a submitted job
+
+        Args:
+            job_id (str) In : id the host gave to the job, None when the
+                              host ran it already
+            job (Job or PackedJob) In : the submitted job
+        """
+        now = time.time()
+        state = "submitted" if job_id is not None else "finished"
+        rows = [
+            (
+                self.experiment_hash(exp),
+                exp.get_name(),
+                exp.get_stdout(),
+                None if job_id is None else str(job_id),
+                job.get_name(),
+                state,
+                now,
+                now,
+            )
+            for exp in job.get_experiments()
+        ]
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO experiments "
+                "(hash, name, stdout, job_id, pack, state, submitted, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.db.executemany(
+                "INSERT INTO transitions VALUES (?, ?, ?)",
+                [(row[0], state, now) for row in rows],
+            )
+
+    def active_jobs(self):
+        """
+        Returns:
+            list of str : ids of the jobs that were not seen finishing
+        """
+        cursor = self.db.execute(
+            "SELECT DISTINCT job_id FROM experiments WHERE job_id IS NOT NULL "
+            "AND state IN (%s)" % ", ".join("?" * len(ACTIVE_STATES)),
+            ACTIVE_STATES,
+        )
+        return [row[0] for row in cursor]
+
+    def update(self, states):
+        """
+        Sets the state of the experiments of every job
+
+        Args:
+            states (dict) In : job id -> (state, exit code, runtime in seconds),
+                               exit code and runtime can be None
+        """
+        now = time.time()
+        with self.db:
+            for job_id, (state, exit_code, runtime) in states.items():
+                self.db.execute(
+                    "INSERT INTO transitions SELECT hash, ?, ? FROM experiments "
+                    "WHERE job_id = ? AND state != ?",
+                    (state, now, job_id, state),
+                )
+                self.db.execute(
+                    "UPDATE experiments SET state = ?, updated = ?, "
+                    "exit_code = COALESCE(?, exit_code), runtime = COALESCE(?, runtime) "
+                    "WHERE job_id = ?",
+                    (state, now, exit_code, runtime, job_id),
+                )
+
+    def get_states(self):
+        """
+        Returns:
+            dict : experiment hash -> state, for all the experiments
+        """
+        return dict(self.db.execute("SELECT hash, state FROM experiments"))
+
+    def get_experiments(self):
+        """
+        Returns:
+            dict : experiment hash -> dict with the columns of the experiments table
+        """
+        cursor = self.db.execute("SELECT * FROM experiments")
+        columns = [column[0] for column in cursor.description]
+        return dict((row[0], dict(zip(columns, row))) for row in cursor)
+
+    def close(self):
+        self.db.close()
@@ -64,6 +64,14 @@ if __name__ == "__main__":
         required=False,
         default=None,
     )
+    b_args.parser.add_argument(
+        "--csv-format",
+        type=str,
+        choices=["csv", "npz", "parquet"],
+        help="Format of --csv-output, npz and parquet store typed columns",
+        required=False,
+        default="csv",
+    )
     b_args.parser.add_argument(
         "--csv-extra",
         nargs="*",
@@ -72,6 +80,48 @@ if __name__ == "__main__":
         required=False,
         default=[],
     )
+    b_args.parser.add_argument(
+        "--csv-jobs",
+        type=int,
+        help="Number of experiments whose stats are extracted concurrently, defaults to the number of cores",
+        required=False,
+        default=None,
+    )
+    b_args.parser.add_argument(
+        "--csv-cache",
+        type=str,
+        help="File to cache the parsed stats, only new or changed outputs are parsed again",
+        required=False,
+        default=None,
+    )
+    b_args.parser.add_argument(
+        "--csv-incremental",
+        help="Keep the rows of --csv-output next to it and only parse new or changed experiments",
+        required=False,
+        action="store_true",
+    )
+    b_args.parser.add_argument(
+        "--csv-aggregate",
+        nargs="*",
+        type=str,
+        help="Statistics of every stat over the experiments of a row added as columns: mean median std min max ci95 pNN",
+        required=False,
+        default=[],
+    )
+    b_args.parser.add_argument(
+        "--csv-buffer",
+        type=int,
+        help="Rows held in memory, more rows are sorted in temporary files",
+        required=False,
+        default=100000,
+    )
+    b_args.parser.add_argument(
+        "--csv-cache-size",
+        type=int,
+        help="Maximum number of experiments kept in the stats cache",
+        required=False,
+        default=100000,
+    )
 
     # Get the benchmarks and print their current status
     # Benchmark - Experiment - #nr of tasks - last update - STATE - last output
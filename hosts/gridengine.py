@@ -28,7 +28,9 @@
 # Authors: E. Castillo (Barcelona Supercomputing Center)
 
 import os
-from hosts.host import Host
+import re
+import subprocess
+from hosts.host import Host, array_dispatch
 
 grideng_script = r"""#!/bin/bash
 # Launch script for clusters using gridengine
@@ -46,8 +48,73 @@ grideng_script = r"""#!/bin/bash
 %(code)s } >%(sim_out)s 2>&1
 """
 
+grideng_array_script = r"""#!/bin/bash
+# Launch script for task arrays using gridengine
+#
+# Job name
+#$ -N %(name)s
+# Specify a shell
+#$ -S /bin/bash
+# One task per job in the task table
+#$ -t 1-%(tasks)d
+%(throttle)s#$ -o %(array_out)s
+#$ -j y
+
+%(dispatch)s
+"""
+
 
 class GridEngine(Host):
+    """
+    Submits jobs with qsub
+
+    Setting "array" : true in the host section of the config.json
+    submits the jobs as task arrays of at most "array_size" tasks
+    (1000 by default), one qsub per array. "array_throttle" limits
+    how many tasks of an array run at once
+    """
+
+    def run_jobs(self, jobs, budget=None):
+        if not self.config.get("array", False):
+            for job, job_id in super(GridEngine, self).run_jobs(jobs, budget):
+                yield job, job_id
+            return
+
+        # The array script has no per job resources, any job can share it
+        arrays = self.group_arrays(
+            jobs, lambda job: None, self.config.get("array_size", 1000), budget
+        )
+        for array in arrays:
+            array_id = self.__run_array(array)
+            for task, job in enumerate(array, 1):
+                yield job, "%s.%d" % (array_id, task)
+
+    def __run_array(self, jobs):
+        """
+        Submits all the jobs in a single task array
+
+        Args:
+            jobs (list of Job) In : jobs of the array
+        Returns:
+            str : id of the array job
+        """
+        prefix = self.write_task_table(jobs)
+        throttle = self.config.get("array_throttle")
+        batchcode = grideng_array_script % {
+            "name": jobs[0].get_name(),
+            "tasks": len(jobs),
+            "throttle": "#$ -tc %d\n" % throttle if throttle else "",
+            "array_out": prefix + ".log",
+            "dispatch": array_dispatch
+            % {"task_id": "SGE_TASK_ID", "table": prefix + ".tasks"},
+        }
+
+        with open(prefix + ".job", "w") as f:
+            f.write(batchcode)
+        # Your job-array 123.1-10:1 ("name") has been submitted
+        output = self.submit(("qsub -l %(queue)s " + prefix + ".job") % self.config)
+        return output.split()[2].split(".")[0]
+
     def run_job(self, job):
 
         batchcode = grideng_script % {
@@ -61,7 +128,50 @@ class GridEngine(Host):
         f.write(batchcode)
         f.close()
 
-        os.system(
+        # Your job 123 ("name") has been submitted
+        output = self.submit(
             ("sleep 0.5 && qsub -l %(queue)s " + job.get_job_script_path())
             % self.config
         )
+        return output.split()[2]
+
+    def get_cluster(self):
+        """
+        The cluster is the "cluster" of the host section of the config.json,
+        or the SGE_CLUSTER_NAME of the environment
+        """
+        cluster = self.config.get("cluster") or os.environ.get("SGE_CLUSTER_NAME")
+        if not cluster:
+            raise ValueError(
+                'The cluster name is unknown, set "cluster" in the host section of the config.json'
+            )
+        return cluster
+
+    def get_queued(self):
+        """
+        Pending tasks of an array share a qstat line with their
+        range in the ja-task-ID column, as in 1-10:1
+        """
+        output = subprocess.check_output(
+            "qstat -u $USER", shell=True, universal_newlines=True
+        )
+        lines = output.splitlines()
+        queued = set()
+        if not lines:
+            return queued
+        # The columns are aligned with the header
+        task_column = lines[0].find("ja-task-ID")
+        for line in lines[2:]:
+            fields = line.split()
+            if not fields:
+                continue
+            queued.add(fields[0])
+            tasks = line[task_column:].strip() if task_column >= 0 else ""
+            for task_range in tasks.split(","):
+                task = re.match(r"^(\d+)(?:-(\d+):(\d+))?$", task_range)
+                if not task:
+                    continue
+                first, last, step = task.groups()
+                for task_id in range(int(first), int(last or first) + 1, int(step or 1)):
+                    queued.add("%s.%d" % (fields[0], task_id))
+        return queued
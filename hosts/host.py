@@ -27,12 +27,41 @@
 #
 # Authors: E. Castillo (Barcelona Supercomputing Center)
 
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# Script of one task of an array job, the array script redirects its output
+task_script = r"""#!/bin/bash
+
+%(env)s
+%(code)s
+"""
+
+# Runs the task of the table line given by the array task index
+array_dispatch = r"""IFS=$'\t' read -r tizona_script tizona_out <<< "$(sed -n "${%(task_id)s}p" %(table)s)"
+bash "$tizona_script" > "$tizona_out" 2>&1
+"""
+
 
 class Host:
     """
     Abstract Interface for a Host
+
+    Submission commands failing are retried "submit_retries" times
+    (3 by default), waiting "submit_backoff" seconds (5 by default)
+    that double after every failure. Both are set in the host section
+    of the config.json
+
+    Hosts able to place job steps on a subset of the nodes of a job set
+    step_launcher, the prefix running a command of a pack as a step
+    with the nodes and slots of its experiment
     """
 
+    step_launcher = None
+
     def __init__(self, config):
         """
         Attributes:
@@ -47,3 +76,229 @@ class Host:
             job (Job object) In : Job to be executed
         """
         raise NotImplementedError
+
+    def run_jobs(self, jobs, budget=None):
+        """
+        Executes a collection of jobs, hosts able to submit
+        several jobs at once override it
+
+        Args:
+            jobs (iterable of Job) In : Jobs to be executed
+            budget (function) In      : returns how many more jobs can be queued,
+                                        hosts submitting several jobs at once do
+                                        not wait for more than that. None for no limit
+        Yields:
+            (Job, str) : each job with the id it got, as they are submitted
+        """
+        for job in jobs:
+            yield job, self.run_job(job)
+
+    def run_jobs_throttled(self, jobs, max_queued, poll_interval):
+        """
+        Executes a collection of jobs keeping at most max_queued jobs of the
+        user in the queue of the host, counting the ones of other launches.
+        When the limit is reached the queue is polled every poll_interval
+        seconds until some of them finish
+
+        Hosts without a queue run the jobs as run_jobs does
+
+        Args:
+            jobs (iterable of Job) In : Jobs to be executed
+            max_queued (int) In       : maximum number of jobs queued or running
+            poll_interval (float) In  : seconds between polls of the queue
+        Yields:
+            (Job, str) : each job with the id it got, as they are submitted
+        """
+        # Jobs of the user in the queue, listed before the first submission
+        queued = 0
+
+        def listed(jobs):
+            nonlocal queued
+            for i, job in enumerate(jobs):
+                if i == 0:
+                    queued = self.__wait_queue(max_queued, poll_interval)
+                yield job
+
+        for job, job_id in self.run_jobs(listed(jobs), lambda: max_queued - queued):
+            yield job, job_id
+            queued += 1
+            if queued >= max_queued:
+                queued = self.__wait_queue(max_queued, poll_interval)
+
+    def __wait_queue(self, max_queued, poll_interval):
+        """
+        Polls the queue every poll_interval seconds until it has room
+
+        Args:
+            max_queued (int) In      : maximum number of jobs queued or running
+            poll_interval (float) In : seconds between polls of the queue
+        Returns:
+            int : jobs of the user in the queue, 0 when the host has no queue
+        """
+        while True:
+            in_queue = self.__retry(self.get_queued, "listing the queue")
+            if in_queue is None:
+                return 0
+            if len(in_queue) < max_queued:
+                return len(in_queue)
+            time.sleep(poll_interval)
+
+    def get_queued(self):
+        """
+        Lists the jobs of the user waiting or running in the host,
+        array tasks are listed one by one as in the ids run_jobs yields
+
+        Returns:
+            set of str : ids of the jobs, None when the host has no queue
+        """
+        return None
+
+    def get_cluster(self):
+        """
+        Hosts with a queue override it, so every machine submitting
+        to the same queue gives the same name
+
+        Returns:
+            str : name of the cluster, the "cluster" of the host section of
+                  the config.json or the machine name
+        """
+        return self.config.get("cluster") or socket.gethostname().split(".")[0]
+
+    def is_running(self, job_id):
+        """
+        Args:
+            job_id (str) In : id run_jobs gave to a job
+        Returns:
+            bool : True while the job is waiting or running in the queue of the host
+        """
+        queued = self.get_queued()
+        return queued is not None and str(job_id) in queued
+
+    def get_states(self, job_ids):
+        """
+        Fetches the state of past jobs, hosts with accounting override it
+        to tell how the finished ones ended
+
+        Jobs of hosts without a queue are already finished, otherwise the jobs
+        listed by get_queued are "queued" and the rest "finished"
+
+        Args:
+            job_ids (list of str) In : ids of the jobs
+        Returns:
+            dict : job id -> (state, exit code, runtime in seconds), exit code
+                   and runtime are None when unknown
+        """
+        queued = self.get_queued() if job_ids else None
+        return dict(
+            (
+                job_id,
+                (
+                    "queued" if queued is not None and job_id in queued else "finished",
+                    None,
+                    None,
+                ),
+            )
+            for job_id in job_ids
+        )
+
+    def submit(self, cmd):
+        """
+        Runs a submission command, retrying it with exponential backoff
+        when it fails
+
+        Args:
+            cmd (str) In : shell command submitting a job
+        Returns:
+            str : output of the command
+        """
+        return self.__retry(
+            lambda: subprocess.check_output(cmd, shell=True, universal_newlines=True),
+            cmd,
+        )
+
+    def __retry(self, call, what):
+        """
+        Calls a function running a command of the host, retrying it with
+        exponential backoff while the command fails
+
+        Args:
+            call (function) In : runs the command
+            what (str) In      : description of the command for the messages
+        Returns:
+            what call returns
+        """
+        retries = self.config.get("submit_retries", 3)
+        backoff = self.config.get("submit_backoff", 5)
+        for attempt in range(retries + 1):
+            try:
+                return call()
+            except subprocess.CalledProcessError as e:
+                if attempt == retries:
+                    raise
+                delay = backoff * 2 ** attempt
+                sys.stderr.write(
+                    "%s failed with status %d, retrying in %gs\n"
+                    % (what, e.returncode, delay)
+                )
+                time.sleep(delay)
+
+    def write_task_table(self, jobs):
+        """
+        Writes the script of every job of an array and the table
+        mapping each array task index (starting at 1) to a job script
+        and its stdout
+
+        The table is stored next to the first job script
+
+        Args:
+            jobs (list of Job) In : jobs of the array
+        Returns:
+            str : path to the table, without extension, to be used as prefix
+                  of the other array files
+        """
+        prefix = os.path.join(
+            os.path.dirname(jobs[0].get_job_script_path()),
+            "%s_array_%s" % (jobs[0].get_name(), time.strftime("%Y%m%d%H%M%S")),
+        )
+        with open(prefix + ".tasks", "w") as table:
+            for job in jobs:
+                with open(job.get_job_script_path(), "w") as f:
+                    f.write(
+                        task_script % {"env": job.get_env(), "code": job.get_cmd_line()}
+                    )
+                table.write("%s\t%s\n" % (job.get_job_script_path(), job.get_stdout()))
+        return prefix
+
+    def group_arrays(self, jobs, key, size, budget=None):
+        """
+        Groups the jobs that can share an array script, arrays are
+        emitted as soon as they are full so jobs can be a generator
+
+        When the jobs waiting for an array reach the budget all of them are
+        emitted, so arrays never take more jobs than the queue has room for
+
+        Args:
+            jobs (iterable of Job) In : jobs to group
+            key (function) In         : jobs with the same key(job) share an array
+            size (int) In             : maximum number of jobs per array
+            budget (function) In      : returns how many more jobs can be queued,
+                                        None for no limit
+        Yields:
+            list of Job : jobs of one array
+        """
+        groups = {}
+        waiting = 0
+        for job in jobs:
+            group = groups.setdefault(key(job), [])
+            group.append(job)
+            waiting += 1
+            if len(group) >= size:
+                waiting -= len(group)
+                yield groups.pop(key(job))
+            elif budget is not None and waiting >= budget():
+                for group in list(groups.values()):
+                    yield group
+                groups = {}
+                waiting = 0
+        for group in groups.values():
+            yield group
@@ -28,6 +28,8 @@
 # Authors: E. Castillo (Barcelona Supercomputing Center)
 
 import os
+import subprocess
+import time
 from hosts.host import Host
 
 local_script = r"""#!/bin/bash
@@ -41,10 +43,24 @@ class LocalHost(Host):
     """
     Runs process in the very same node
     as batcher is
+
+    Setting "parallel" : true in the host section of the config.json
+    runs several jobs at once, as long as the slots they declare do not
+    exceed the "slots" of the host (the number of cores by default)
+
+    Attributes:
+        exit_status (dict) : job script path -> exit status of the jobs run in parallel
     """
 
-    def run_job(self, job):
+    def __init__(self, config):
+        Host.__init__(self, config)
+        self.exit_status = {}
 
+    def __write_script(self, job):
+        """
+        Returns:
+            str : path to the script running the job
+        """
         batchcode = local_script % {
             "code": job.get_cmd_line(),
             "env": job.get_env(),
@@ -55,5 +71,55 @@ class LocalHost(Host):
         f = open(job.get_job_script_path(), "w")
         f.write(batchcode)
         f.close()
+        return job.get_job_script_path()
+
+    def run_job(self, job):
+        os.system("bash %s" % self.__write_script(job))
+
+    def run_jobs(self, jobs, budget=None):
+        if not self.config.get("parallel", False):
+            for job, job_id in super(LocalHost, self).run_jobs(jobs, budget):
+                yield job, job_id
+            return
+
+        capacity = self.config.get("slots") or os.cpu_count() or 1
+        # pid -> (process, job, slots)
+        running = {}
+        used = 0
+        for job in jobs:
+            # Jobs bigger than the host run alone
+            slots = min(job.get_slots(), capacity)
+            while used + slots > capacity:
+                used -= self.__wait(running)
+            proc = subprocess.Popen(["bash", self.__write_script(job)])
+            running[proc.pid] = (proc, job, slots)
+            used += slots
+            yield job, str(proc.pid)
+
+        while running:
+            self.__wait(running)
+
+        failed = [path for path in self.exit_status if self.exit_status[path]]
+        for path in failed:
+            print("%s exited with status %d" % (path, self.exit_status[path]))
+
+    def __wait(self, running):
+        """
+        Waits for any of the running jobs to finish and records its exit status
+
+        Only the processes of the running jobs are polled, other children
+        of the process are left alone
 
-        os.system("bash %s" % job.get_job_script_path())
+        Args:
+            running (dict) InOut : pid -> (process, job, slots) of the running jobs
+        Returns:
+            int : slots released by the finished job
+        """
+        while True:
+            for pid in list(running):
+                proc, job, slots = running[pid]
+                if proc.poll() is not None:
+                    del running[pid]
+                    self.exit_status[job.get_job_script_path()] = proc.returncode
+                    return slots
+            time.sleep(0.05)
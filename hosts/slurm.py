@@ -1,6 +1,6 @@
 import os
 import subprocess
-from hosts.host import Host
+from hosts.host import Host, array_dispatch
 
 slurm_script = r"""#!/bin/bash
 #SBATCH -N %(nodes)d
@@ -16,8 +16,82 @@ slurm_script = r"""#!/bin/bash
 %(code)s
 """
 
+slurm_array_script = r"""#!/bin/bash
+#SBATCH -N %(nodes)d
+#SBATCH -J %(name)s
+#SBATCH -t %(wall_time)s
+#SBATCH -p %(partition)s
+#SBATCH -o %(array_out)s
+#SBATCH --open-mode=append
+#SBATCH -A %(account)s
+#SBATCH --array=1-%(tasks)d%(throttle)s
+
+%(dispatch)s
+"""
+
 
 class Slurm(Host):
+    """
+    Submits jobs with sbatch
+
+    Setting "array" : true in the host section of the config.json
+    submits the jobs as job arrays, one sbatch per array instead of
+    one per job. Jobs requesting the same nodes and wall time share
+    an array of at most "array_size" tasks (1000 by default), and
+    "array_throttle" limits how many of its tasks run at once
+
+    The experiments of concurrent packs run as exclusive job steps
+    """
+
+    step_launcher = "srun -N %(nodes)d -n %(slots)d --exclusive"
+
+    def run_jobs(self, jobs, budget=None):
+        if not self.config.get("array", False):
+            for job, job_id in super(Slurm, self).run_jobs(jobs, budget):
+                yield job, job_id
+            return
+
+        arrays = self.group_arrays(
+            jobs,
+            lambda job: (job.get_nodes(), job.get_wall_time()),
+            self.config.get("array_size", 1000),
+            budget,
+        )
+        for array in arrays:
+            array_id = self.__run_array(array)
+            for task, job in enumerate(array, 1):
+                yield job, "%s_%d" % (array_id, task)
+
+    def __run_array(self, jobs):
+        """
+        Submits all the jobs in a single array
+
+        Args:
+            jobs (list of Job) In : jobs sharing nodes and wall time
+        Returns:
+            str : id of the array job
+        """
+        prefix = self.write_task_table(jobs)
+        throttle = self.config.get("array_throttle")
+        batchcode = slurm_array_script % {
+            "partition": self.config["partition"],
+            "account": self.config["account"],
+            "name": jobs[0].get_name(),
+            "nodes": jobs[0].get_nodes(),
+            "wall_time": jobs[0].get_wall_time(),
+            "array_out": prefix + ".log",
+            "tasks": len(jobs),
+            "throttle": "%%%d" % throttle if throttle else "",
+            "dispatch": array_dispatch
+            % {"task_id": "SLURM_ARRAY_TASK_ID", "table": prefix + ".tasks"},
+        }
+
+        with open(prefix + ".job", "w") as f:
+            f.write(batchcode)
+        output = self.submit("sbatch %s" % (prefix + ".job"))
+        # Return the array job id
+        return output.split()[-1]
+
     def run_job(self, job):
         # Check if the same job was submitted before
         # Name conflict
@@ -28,7 +102,7 @@ class Slurm(Host):
             "code": job.get_cmd_line(),
             "env": job.get_env(),
             "name": job.get_name(),
-            "nodes": job.get_param("nodes"),
+            "nodes": job.get_nodes(),
             "wall_time": job.get_wall_time(),
             "sim_out": job.get_stdout(),
         }
@@ -36,11 +110,92 @@ class Slurm(Host):
         f = open(job.get_job_script_path(), "w")
         f.write(batchcode)
         f.close()
-        output = subprocess.check_output(
-            "sleep 0.1 && sbatch %s" % job.get_job_script_path(), shell=True
-        )
+        output = self.submit("sleep 0.1 && sbatch %s" % job.get_job_script_path())
         # Return the job id
         return output.split()[-1]
 
-    def is_running(self, exp):
-        return False
+    def get_cluster(self):
+        """
+        Login nodes of a cluster share its ClusterName
+        """
+        if self.config.get("cluster"):
+            return self.config["cluster"]
+        try:
+            output = subprocess.check_output(
+                "scontrol show config", shell=True, universal_newlines=True
+            )
+        except subprocess.CalledProcessError:
+            output = ""
+        for line in output.splitlines():
+            key, _, value = line.partition("=")
+            if key.strip() == "ClusterName" and value.strip():
+                return value.strip()
+        raise ValueError(
+            'The cluster name is unknown, set "cluster" in the host section of the config.json'
+        )
+
+    def get_queued(self):
+        # Pending array tasks are listed one by one with -r
+        output = subprocess.check_output(
+            "squeue -h -r -u $USER -o %i", shell=True, universal_newlines=True
+        )
+        return set(output.split())
+
+    def get_states(self, job_ids):
+        """
+        Asks sacct for the jobs in chunks of 1000 ids, falls back to
+        the queue when accounting is not available
+
+        Jobs sacct does not list, as when accounting lags behind or forgot
+        them, are queued while squeue lists them and unknown otherwise, so
+        their outputs tell whether they ran
+        """
+        states = {}
+        try:
+            for i in range(0, len(job_ids), 1000):
+                output = subprocess.check_output(
+                    "sacct -n -P -X -o JobID,State,ExitCode,ElapsedRaw -j %s"
+                    % ",".join(job_ids[i : i + 1000]),
+                    shell=True,
+                    universal_newlines=True,
+                )
+                for line in output.splitlines():
+                    fields = line.split("|")
+                    if len(fields) < 4:
+                        continue
+                    job_id, state, exit_code, elapsed = fields[:4]
+                    # CANCELLED by 1234
+                    state = state.split()[0].lower() if state else "submitted"
+                    if state in ("node_fail", "out_of_memory", "boot_fail"):
+                        state = "failed"
+                    exit_code = int(exit_code.split(":")[0]) if exit_code else None
+                    runtime = float(elapsed) if elapsed.isdigit() else None
+                    for task_id in self.__expand_tasks(job_id):
+                        states[task_id] = (state, exit_code, runtime)
+            missing = [job_id for job_id in job_ids if job_id not in states]
+            if missing:
+                queued = self.get_queued()
+                for job_id in missing:
+                    state = "queued" if job_id in queued else "unknown"
+                    states[job_id] = (state, None, None)
+        except (subprocess.CalledProcessError, OSError):
+            return Host.get_states(self, job_ids)
+        return states
+
+    def __expand_tasks(self, job_id):
+        """
+        Pending array tasks are listed together by sacct, as in 123_[4-6,9]
+
+        Returns:
+            list of str : ids of the tasks
+        """
+        if "_[" not in job_id:
+            return [job_id]
+        array_id, tasks = job_id[:-1].split("_[")
+        task_ids = []
+        # The throttle follows a %
+        for task_range in tasks.split("%")[0].split(","):
+            first, _, last = task_range.partition("-")
+            for task in range(int(first), int(last or first) + 1):
+                task_ids.append("%s_%d" % (array_id, task))
+        return task_ids
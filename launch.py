@@ -36,4 +36,4 @@ if __name__ == "__main__":
 
     b_args = BatcherArgs()
     cfg = Config(b_args)
-    Batcher(cfg).run()
+    Batcher(cfg, promote=cfg.get_args().promote).run()
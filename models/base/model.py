@@ -27,7 +27,12 @@
 #
 # Authors: E. Castillo (Barcelona Supercomputing Center)
 
+import heapq
+import math
 import os
+import shlex
+
+from utils import walltime
 
 """
 Binary File Runner
@@ -94,25 +99,79 @@ class PackedJob(object):
     class DifferentParamsException(Exception):
         pass
 
-    def __init__(self, pack_id, pack):
+    __slots__ = (
+        "pack",
+        "pack_id",
+        "margin",
+        "width",
+        "launcher",
+        "pack_name",
+        "working_dir",
+    )
+
+    def __init__(self, pack_id, pack, margin=0.0, width=1, launcher=None):
         """
         Args/Attributes:
             pack_id (int) : id for the current pack
             pack (list of experiment) : experiments the pack holds
+            margin (float) : fraction of the experiments wall time added to the pack one
+            width (int) : experiments running at the same time
+            launcher (str) : step_launcher of the host, None when the host
+                             can not place the experiments on their own nodes
+        Attributes:
+            pack_name, working_dir (str) : resolved on first use
         """
         self.pack = pack
         self.pack_id = pack_id
+        self.margin = margin
+        self.width = width
+        self.launcher = launcher
+        self.pack_name = None
+        self.working_dir = None
+
+    def get_lanes(self):
+        """
+        Returns:
+            int : experiments of the pack that run at the same time
+        """
+        return max(1, min(self.width, len(self.pack)))
+
+    def get_schedule(self):
+        """
+        Concurrent packs launch the longest experiments first, so the
+        lanes finish as close to each other as possible
+
+        Returns:
+            list of Job : experiments in the order they are launched
+        """
+        if self.get_lanes() == 1:
+            return self.pack
+        return sorted(
+            self.pack,
+            key=lambda exp: walltime.to_seconds(exp.get_wall_time()),
+            reverse=True,
+        )
 
     def get_cmd_line(self):
         """
         Get the code to be executed by this batch,
         for each experiment we set the environment and change the directory
         according to the invidual needs
+
+        When the pack is wider than one lane each experiment runs in the
+        background in its own subshell, and the next one is launched as
+        soon as one of the running experiments finishes. Hosts with a
+        step launcher run each of them on its own nodes
         Returns:
             str : body of the job with the cmdlines for all the experiments
         """
+        lanes = self.get_lanes()
         code = ""
-        for exp in self.pack:
+        for exp in self.get_schedule():
+            if lanes > 1:
+                # Wait for a free lane
+                code += "while [ $(jobs -rp | wc -l) -ge %d ]; do wait -n; done\n" % lanes
+                code += "(\n"
             # Load the specific job environment
             code += exp.get_env() + "\n"
             # We need to go to the app_dir
@@ -120,10 +179,34 @@ class PackedJob(object):
                 code += "cd " + exp.get_app_dir() + "\n"
             # Do the stdout redirection here
             # This is a packed job
-            code += exp.get_cmd_line() + " > " + exp.get_stdout() + " 2>&1\n"
-
+            if lanes > 1:
+                cmd_line = self.get_step(exp)
+            else:
+                cmd_line = exp.get_cmd_line()
+            code += cmd_line + " > " + exp.get_stdout() + " 2>&1\n"
+            if lanes > 1:
+                code += ") &\n"
+
+        if lanes > 1:
+            code += "wait\n"
         return code
 
+    def get_step(self, exp):
+        """
+        The whole cmdline of the experiment, which may span several lines,
+        runs in a single shell so every command of it is inside the step
+
+        Args:
+            exp (Job) : experiment of the pack
+        Returns:
+            str : cmdline launching the experiment as a job step on its own
+                  nodes, the plain cmdline when the host has no step launcher
+        """
+        if self.launcher is None:
+            return exp.get_cmd_line()
+        launcher = self.launcher % {"nodes": exp.get_nodes(), "slots": exp.get_slots()}
+        return launcher + " bash -c " + shlex.quote(exp.get_cmd_line())
+
     def get_pack_name(self):
         """
         Return a PACK name, there is no point on returning the name of a specific
@@ -132,6 +215,9 @@ class PackedJob(object):
         Returns:
             str : experiment name
         """
+        if self.pack_name is not None:
+            return self.pack_name
+
         lpack_name = self.pack[0].get_pack_name()
         for exp in self.pack[1:]:
             cpack_name = exp.get_pack_name()
@@ -140,6 +226,7 @@ class PackedJob(object):
                     "Expected %s pack name, saw %s" % (lpack_name, cpack_name)
                 )
 
+        self.pack_name = lpack_name
         return lpack_name
 
     def get_name(self):
@@ -159,11 +246,33 @@ class PackedJob(object):
             str : stdout file
         """
         # This is the GLOBAL out, not the individual exps
-        wd_path = os.path.join(self.pack[0].config["OUT_DIR"], self.get_pack_name())
-        wd_path = os.path.expandvars(os.path.dirname(wd_path))
-        if not os.path.exists(wd_path):
-            os.makedirs(wd_path)
-        return os.path.join(wd_path, self.get_name() + ".out")
+        return os.path.join(self.get_working_dir(), self.get_name() + ".out")
+
+    def get_working_dir(self):
+        """
+        Returns:
+            str : directory holding the pack script and its global out
+        """
+        if self.working_dir is None:
+            wd_path = os.path.join(self.pack[0].config["OUT_DIR"], self.get_pack_name())
+            self.working_dir = os.path.expandvars(os.path.dirname(wd_path))
+        return self.working_dir
+
+    def get_required_dirs(self):
+        """
+        Returns:
+            list of str : the pack directory and the ones of its experiments
+        """
+        dirs = [self.get_working_dir()]
+        for exp in self.pack:
+            dirs.extend(exp.get_required_dirs())
+        return dirs
+
+    def materialize(self):
+        """ Creates the directories the pack and its experiments need """
+        for path in set(self.get_required_dirs()):
+            if not os.path.exists(path):
+                os.makedirs(path, exist_ok=True)
 
     def get_param(self, param):
         """
@@ -186,15 +295,55 @@ class PackedJob(object):
 
         return lparam
 
+    def get_experiments(self):
+        """
+        Returns:
+            list of Job : experiments the pack runs
+        """
+        return self.pack
+
     def get_env(self):
         # Packed experiments do not have a global env setting
         # They set the environment before launching each experiment
         return "\n"
 
+    def get_slots(self):
+        """
+        Every lane of the pack needs as many slots as its biggest experiment
+
+        Returns:
+            int : slots the pack consumes
+        """
+        return max(exp.get_slots() for exp in self.pack) * self.get_lanes()
+
+    def get_nodes(self):
+        """
+        When the experiments are placed on their own nodes every lane of the
+        pack needs as many nodes as its biggest experiment, otherwise they
+        share the nodes of the biggest one
+
+        Returns:
+            int : nodes the pack requests
+        """
+        nodes = max(exp.get_nodes() for exp in self.pack)
+        if self.launcher is None:
+            return nodes
+        return nodes * self.get_lanes()
+
     def get_wall_time(self):
-        # Return one of the wall times
-        # TODO: make it to return the sum?
-        return self.pack[0].get_wall_time()
+        """
+        Experiments are launched in the schedule order on the first free lane,
+        with a single lane they run one after another
+
+        Returns:
+            str : time the last lane finishes plus the margin
+        """
+        lanes = [0] * self.get_lanes()
+        for exp in self.get_schedule():
+            start = heapq.heappop(lanes)
+            heapq.heappush(lanes, start + walltime.to_seconds(exp.get_wall_time()))
+        seconds = max(lanes)
+        return walltime.to_string(math.ceil(round(seconds * (1 + self.margin), 3)))
 
     def get_app_dir(self):
         """
@@ -210,19 +359,106 @@ class PackedJob(object):
         Returns:
             str : path to the batch script with all the experiments
         """
-        wd_path = os.path.join(self.pack[0].config["OUT_DIR"], self.get_pack_name())
-        wd_path = os.path.expandvars(os.path.dirname(wd_path))
-        if not os.path.exists(wd_path):
-            os.makedirs(wd_path)
-        return os.path.join(wd_path, self.get_name() + ".job")
+        return os.path.join(self.get_working_dir(), self.get_name() + ".job")
+
+
+class ShelfPackedJob(PackedJob):
+    """
+    Pack of experiments with different node counts sharing one allocation
+
+    The allocation is split in shelves that run one after another. The
+    experiments of a shelf run at the same time, side by side on the nodes
+    of the allocation, and the shelf lasts as long as its longest experiment
+    """
+
+    __slots__ = ("shelves",)
+
+    def __init__(self, pack_id, shelves, margin=0.0, launcher=None):
+        """
+        Args:
+            pack_id (int) : id for the current pack
+            shelves (list of list of experiment) : experiments of every shelf
+            margin (float) : fraction of the experiments wall time added to the pack one
+            launcher (str) : step_launcher of the host, None when it has none
+        Attributes:
+            shelves (list of list of experiment) : experiments of every shelf
+        """
+        PackedJob.__init__(
+            self,
+            pack_id,
+            [exp for shelf in shelves for exp in shelf],
+            margin,
+            launcher=launcher,
+        )
+        self.shelves = shelves
+
+    def get_cmd_line(self):
+        """
+        Every experiment of a shelf runs in the background in its own subshell,
+        with all the lines of its cmdline in a step on its own nodes with hosts
+        having a step launcher, and the next shelf starts once all of them finish
+
+        Returns:
+            str : body of the job with the cmdlines for all the experiments
+        """
+        code = ""
+        for shelf in self.shelves:
+            for exp in shelf:
+                code += "(\n" + exp.get_env() + "\n"
+                if exp.get_app_dir():
+                    code += "cd " + exp.get_app_dir() + "\n"
+                code += self.get_step(exp)
+                code += " > " + exp.get_stdout() + " 2>&1\n"
+                code += ") &\n"
+            code += "wait\n"
+        return code
+
+    def get_slots(self):
+        """
+        Returns:
+            int : slots of the shelf that consumes the most
+        """
+        return max(sum(exp.get_slots() for exp in shelf) for shelf in self.shelves)
+
+    def get_nodes(self):
+        """
+        Returns:
+            int : nodes of the widest shelf
+        """
+        return max(sum(exp.get_nodes() for exp in shelf) for shelf in self.shelves)
+
+    def get_wall_time(self):
+        """
+        Returns:
+            str : sum of the longest wall time of every shelf plus the margin
+        """
+        seconds = sum(
+            max(walltime.to_seconds(exp.get_wall_time()) for exp in shelf)
+            for shelf in self.shelves
+        )
+        return walltime.to_string(math.ceil(round(seconds * (1 + self.margin), 3)))
 
 
 class Job(object):
     """
     Containes and provides methods to access
     all the relevant job parameters
+
+    Paths are resolved once and never touch the filesystem,
+    directories are only created by materialize
     """
 
+    __slots__ = (
+        "experiment",
+        "param_sample",
+        "job_id",
+        "config",
+        "name",
+        "working_dir",
+        "stdout",
+        "wall_time",
+    )
+
     def __init__(self, experiment, param_sample, job_id, config):
         """
         Initializes a job based on the general experiments description
@@ -237,19 +473,49 @@ class Job(object):
             job_id (int) In        : The id of the job
             config (config obj) In : The config object with the module settings
 
+        Attributes:
+            name, working_dir, stdout (str) : resolved paths, filled on first use
+            wall_time (str) : overrides the wall_time of the experiment when set
         """
         self.experiment = experiment
         self.param_sample = param_sample
         self.job_id = job_id
         self.config = config
+        self.name = None
+        self.working_dir = None
+        self.stdout = None
+        self.wall_time = None
 
     def prepare(self):
         """
         Do any work required prior launching the job
         This is module specific
+
+        The working directory is not created yet, call
+        materialize if the job needs it at this point
         """
         pass
 
+    def get_experiments(self):
+        """
+        Returns:
+            list of Job : experiments the job runs, itself
+        """
+        return [self]
+
+    def get_required_dirs(self):
+        """
+        Returns:
+            list of str : directories that must exist before submitting the job
+        """
+        return [self.get_working_dir()]
+
+    def materialize(self):
+        """ Creates the directories the job needs """
+        for path in self.get_required_dirs():
+            if not os.path.exists(path):
+                os.makedirs(path, exist_ok=True)
+
     def __get_exp_list_as_line(self, key):
         """
         Given a key of the experiment file
@@ -297,13 +563,15 @@ class Job(object):
             str : self.experiment['name'] with the placeholders
                     replaced by the values in the param sample
         """
-        return (self.experiment["name"] % self.param_sample).replace(" ", "_")
+        if self.name is None:
+            self.name = (self.experiment["name"] % self.param_sample).replace(" ", "_")
+        return self.name
 
     def get_working_dir(self):
         """
         Returns the working dir for the experiment
-        if it does not exist create it under the
-        config['base']['OUT_DIR'] directory
+        under the config['base']['OUT_DIR'] directory.
+        It is created by materialize
 
         The working directory can be specified using
         parameters
@@ -311,13 +579,11 @@ class Job(object):
         Returns:
             str : path to the jobs working directory
         """
-
-        wd_name = self.experiment["working_dir"] % self.param_sample
-        wd_path = os.path.join(self.config["OUT_DIR"], wd_name)
-        wd_path = os.path.expandvars(wd_path)
-        if not os.path.exists(wd_path):
-            os.makedirs(wd_path)
-        return wd_path
+        if self.working_dir is None:
+            wd_name = self.experiment["working_dir"] % self.param_sample
+            wd_path = os.path.join(self.config["OUT_DIR"], wd_name)
+            self.working_dir = os.path.expandvars(wd_path)
+        return self.working_dir
 
     def get_graph_name(self):
         """
@@ -350,7 +616,9 @@ class Job(object):
         Returns:
             str : path to the file where the stdout will be stored
         """
-        return os.path.join(self.get_working_dir(), self.get_name() + ".out")
+        if self.stdout is None:
+            self.stdout = os.path.join(self.get_working_dir(), self.get_name() + ".out")
+        return self.stdout
 
     def get_stderr(self):
         """
@@ -372,10 +640,59 @@ class Job(object):
         return os.path.join(self.get_working_dir(), self.get_name() + ".job")
 
     def get_wall_time(self):
+        """
+        The wall_time field of the experiment can use parameters
+        as in "%(hours)02d:00:00"
+
+        Returns:
+            str : wall time requested for the job
+        """
+        if self.wall_time is not None:
+            return self.wall_time
         if "wall_time" in self.experiment:
-            return self.experiment["wall_time"]
+            return self.experiment["wall_time"] % self.param_sample
         return "01:00:00"
 
+    def set_wall_time(self, wall_time):
+        """
+        Args:
+            wall_time (str) In : wall time to request instead of the experiment one
+        """
+        self.wall_time = wall_time
+
+    def get_runtime_stat(self):
+        """
+        Returns:
+            str : name of the stat holding the runtime in seconds of the job,
+                  as set in the runtime_stat field. None when there is not one
+        """
+        if "runtime_stat" in self.experiment:
+            return self.experiment["runtime_stat"]
+        return None
+
+    def get_slots(self):
+        """
+        The "slots" field of the experiment sets how many slots (cores) of
+        the host the job consumes. It can be a number or use parameters
+        as in "%(ranks)d"
+
+        Returns:
+            int : slots the job consumes, 1 by default
+        """
+        if "slots" not in self.experiment:
+            return 1
+        slots = self.experiment["slots"]
+        if type(slots) is str:
+            slots = slots % self.param_sample
+        return int(slots)
+
+    def get_nodes(self):
+        """
+        Returns:
+            int : nodes the job requests, as set in the nodes param
+        """
+        return int(self.get_param("nodes"))
+
     def get_pack_name(self):
         """
         Returns:
@@ -391,9 +708,14 @@ class Job(object):
         """
         return self.experiment["stats"]
 
-    def is_executed(self):
+    def is_executed(self, index=None):
         """
+        Args:
+            index (set) In : Optional, normalized paths of the existing stdout files.
+                             When given the filesystem is not accessed
         Returns:
             bool : True when the stdout file already exists (the Job was executed)
         """
+        if index is not None:
+            return os.path.normpath(self.get_stdout()) in index
         return os.path.isfile(self.get_stdout())
@@ -28,36 +28,169 @@
 # Authors: E. Castillo (Barcelona Supercomputing Center)
 
 from utils import files
+import mmap
+import re
 import subprocess
 from collections import defaultdict
 import numpy as np
 import os.path
 
 
+class Rule(object):
+    """
+    Native extraction rule, declared as a dict in the "stats" field
+    instead of a bash cmdline:
+
+        "cycles" : {"regex" : "^Cycles", "field" : -1, "match" : "last"}
+
+    Keys:
+        regex (str)     : Lines matching the regex hold the value. When the regex
+                          has a group the value is the first group, otherwise the line
+        field (int)     : Optional, index of the field of the value to keep
+        delimiter (str) : Optional, fields separator, defaults to any whitespace
+        match (str)     : Keep the first, the last (default) or all the matches
+        file (str)      : Optional, file to read, defaults to %(stdout)s
+    """
+
+    def __init__(self, spec):
+        """
+        Args:
+            spec (dict) In : rule as written in the json file
+        """
+        self.pattern = spec["regex"]
+        try:
+            self.regex = re.compile(self.pattern.encode(), re.MULTILINE)
+        except re.error as e:
+            raise ValueError("Invalid regex %s: %s" % (self.pattern, e))
+        # Patterns with inline flags can not be joined with other rules
+        try:
+            re.compile(b"(?:%s)" % self.pattern.encode())
+            self.joinable = True
+        except re.error:
+            self.joinable = False
+        self.field = spec.get("field")
+        self.delimiter = spec.get("delimiter")
+        if self.delimiter is not None:
+            self.delimiter = self.delimiter.encode()
+        self.match = spec.get("match", "last")
+        self.file = spec.get("file", "%(stdout)s")
+        if self.match not in ("first", "last", "all"):
+            raise ValueError("Unknown match %s, use first, last or all" % self.match)
+
+    def value(self, line):
+        """
+        Args:
+            line (bytes) In : line of the parsed file
+        Returns:
+            str : the value in the line or None when the rule does not match
+        """
+        found = self.regex.search(line)
+        if not found:
+            return None
+        value = found.group(1) if self.regex.groups else line
+        if self.field is not None:
+            try:
+                value = value.split(self.delimiter)[self.field]
+            except IndexError:
+                return None
+        return value.strip().decode("utf-8", "replace")
+
+
+def scan(path, rules):
+    """
+    Applies all the rules to the file in a single pass over its memory mapped contents
+
+    A regex joining all the rules finds the candidate lines, then only those
+    lines are matched against each rule. Rules that can not be joined, as the
+    ones with inline flags, find their lines with their own regex
+
+    Args:
+        path (str) In   : file to parse
+        rules (dict) In : stat name -> Rule
+    Returns:
+        dict : stat name -> list of values found
+    """
+    values = defaultdict(list)
+    joined = dict((stat, rule) for stat, rule in rules.items() if rule.joinable)
+    # regex finding the candidate lines -> rules matched against them
+    passes = []
+    if joined:
+        joint = re.compile(
+            b"|".join(b"(?:%s)" % rule.pattern.encode() for rule in joined.values()),
+            re.MULTILINE,
+        )
+        passes.append((joint, joined))
+    for stat, rule in rules.items():
+        if not rule.joinable:
+            passes.append((rule.regex, {stat: rule}))
+
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can not be mapped
+            return values
+        with data:
+            for regex, pending in passes:
+                pending = dict(pending)
+                pos = 0
+                while pending:
+                    found = regex.search(data, pos)
+                    if not found:
+                        break
+                    start = data.rfind(b"\n", 0, found.start()) + 1
+                    end = data.find(b"\n", found.start())
+                    if end < 0:
+                        end = len(data)
+                    line = data[start:end]
+                    for stat, rule in list(pending.items()):
+                        value = rule.value(line)
+                        if value is None:
+                            continue
+                        if rule.match == "all":
+                            values[stat].append(value)
+                        else:
+                            values[stat] = [value]
+                            if rule.match == "first":
+                                del pending[stat]
+                    pos = end + 1
+    return values
+
+
 class Stats(object):
     """
     Parses and stores the relevant stats of the job
 
     This module call the bash statement provided in the config.json
     "stats" : {"stat_name" : "grep ..."} to get the value for the stat
+
+    Stats declared as a Rule dict are not run through bash, all the
+    rules reading the same file are applied in a single pass over it
+
+    When a StatsCache is given, stats whose values were already parsed
+    from the current stdout are taken from it
     """
 
-    def __init__(self, job):
+    def __init__(self, job, cache=None, names=None):
         """
         Args:
-            job (job object) In : The job to get the stats from
+            job (job object) In    : The job to get the stats from
+            cache (StatsCache) In  : Optional, cache of already parsed values
+            names (list) In        : Optional, stats to read, all of them by default
         Attributes:
             stats (dict) : holds the readed values from the job stdout
         """
-        self.stats = self.__read_stats(job)
+        self.stats = self.__read_stats(job, cache, names)
 
-    def __read_stats(self, job):
+    def __read_stats(self, job, cache=None, names=None):
         """
         Parses the job stdout and stores the stats
         in a dict of lists
 
         Args:
-            job (job object) In : The job to get the stats from
+            job (job object) In   : The job to get the stats from
+            cache (StatsCache) In : Optional, cache of already parsed values
+            names (list) In       : Optional, stats to read, all of them by default
         Returns:
             dict : contains the parsed stats for the job
         """
@@ -69,14 +202,48 @@ class Stats(object):
         placeholders["app_dir"] = job.get_app_dir()
         placeholders["name"] = job.get_name()
 
+        # Native rules grouped by the file they read
+        rules = defaultdict(dict)
+
         cmds = job.get_stats()
+        if names is not None:
+            cmds = dict((stat, cmds[stat]) for stat in names if stat in cmds)
+
+        # Outputs that do not exist yet are never cached
+        fingerprint = None
+        if cache is not None:
+            fingerprint = cache.fingerprint(placeholders["stdout"])
+
         for stat in cmds:
+            if fingerprint is not None:
+                values = cache.get(placeholders["stdout"], fingerprint, cmds[stat])
+                if values is not None:
+                    stats[stat] = list(values)
+                    continue
+            if type(cmds[stat]) is dict:
+                rule = Rule(cmds[stat])
+                rules[rule.file % placeholders][stat] = rule
+                continue
             try:
                 stats[stat].append(
-                    subprocess.check_output(cmds[stat] % placeholders, shell=True)
+                    subprocess.check_output(
+                        cmds[stat] % placeholders, shell=True, universal_newlines=True
+                    )
                 )
             except:
                 stats[stat].append("0.0")
+
+        for path in rules:
+            try:
+                values = scan(path, rules[path])
+            except (IOError, OSError):
+                values = dict((stat, ["0.0"]) for stat in rules[path])
+            for stat in values:
+                stats[stat].extend(values[stat])
+
+        if fingerprint is not None:
+            for stat in cmds:
+                cache.put(placeholders["stdout"], fingerprint, cmds[stat], stats[stat])
         return stats
 
     def get_stat(self, stat):
@@ -84,8 +251,10 @@ class Stats(object):
         Args:
             stat (str) In : stat to get the AVG value from
         Returns:
-            float : Average value for stat
+            float : Average value for stat, None when it has no values
         """
+        if not self.stats[stat]:
+            return None
         try:
             return np.average([float(x) for x in self.stats[stat]])
         except:
@@ -29,15 +29,22 @@
 
 from __future__ import print_function
 from utils import files
+from utils import loaders
+from results.aggregate import Aggregator
+from results.cache import StatsCache
+from results.collector import Collector
+from results import columnar
+from results.incremental import RowStore
+from results.rows import RowBuilder
 from collections import OrderedDict
 import operator
 import os
+import re
+import sqlite3
+import sys
 
-
-class NestedDict(OrderedDict):
-    def __missing__(self, key):
-        self[key] = NestedDict()
-        return self[key]
+# csv.py shadows the csv module of the standard library
+stdcsv = loaders.load_stdlib_module("csv")
 
 
 class Results(object):
@@ -48,35 +55,227 @@ class Results(object):
     def __init__(self, config):
         self.config = config
 
-    def process(self, experiments, params, stats, query, extra_files, output):
-        self.__create_csv(experiments, params, stats, output)
-        if query:
-            self.__run_sql(output, query, extra_files)
+    def process(
+        self, experiments, params, stats, query, extra_files, output, parsed=None
+    ):
+        """
+        Args:
+            parsed (dict) In : Optional, stdout -> {stat -> value} of the experiments
+                               already parsed, as returned by collect
+        """
+        csv = self.__create_csv(experiments, params, stats, output, parsed)
+        try:
+            if query:
+                headers, rows = self.__run_sql(csv, output, query, extra_files)
+                self.__write(headers, rows, output)
+            else:
+                headers = csv.headers()
+                fixed = len(headers) - len(csv.value_headers())
+                self.__write(headers, csv.rows(), output, len(params), fixed)
+        finally:
+            csv.close()
+
+    def __write(self, headers, rows, output, keys=None, fixed=None):
+        """
+        Writes the rows in the output with the --csv-format format,
+        csv files are printed when there is no output
+
+        Args:
+            headers (list of str) In   : names of the columns
+            rows (iterable of list) In : values of every row
+            output (str) In            : file to write
+            keys (int) In              : leading columns holding params, None to
+                                         find out the columns that are not numbers
+            fixed (int) In             : leading columns that rows do not repeat
+        """
+        fmt = self.config.get_args().csv_format
+        if fmt != "csv":
+            if not output:
+                raise ValueError("--csv-format %s needs a --csv-output file" % fmt)
+            columns = columnar.build_columns(headers, rows, keys, fixed)
+            columnar.writers[fmt](output, columns)
+            return
 
-    def __create_csv(self, experiments, params, stats, output):
+        out = open(output, "w") if output else sys.stdout
+        try:
+            print(",".join(headers), file=out)
+            for row in rows:
+                print(
+                    ",".join("" if value is None else str(value) for value in row),
+                    file=out,
+                )
+        finally:
+            if output:
+                out.close()
+
+    def collect(self, outputs):
+        """
+        Parses once the experiments that several outputs need. Experiments
+        that the row store of an output holds are not needed by that output,
+        and the ones needed by a single output are left to it
+
+        Args:
+            outputs (list of tuple) In : (experiments, params, stats, output file)
+                                         of every output
+        Returns:
+            dict : stdout -> {stat -> value} of the stats the outputs need
+        """
+        args = self.config.get_args()
+        # stdout -> [experiment, stats needed, outputs needing it]
+        needed = OrderedDict()
+        for experiments, params, stats, output in outputs:
+            rows = None
+            if args.csv_incremental and output:
+                rows = RowStore(output + ".rows", [params, stats])
+            for exp in experiments:
+                key = exp.get_stdout()
+                if rows is not None and rows.get(
+                    key, StatsCache.fingerprint(key), RowStore.digest(exp, stats)
+                ) is not None:
+                    continue
+                entry = needed.setdefault(key, [exp, set(), 0])
+                entry[1].update(stats)
+                entry[2] += 1
+        shared = [exp for exp, _, count in needed.values() if count > 1]
+
+        cache = None
+        if args.csv_cache:
+            cache = StatsCache(args.csv_cache, args.csv_cache_size)
+        parsed = {}
+        for exp, sim_stats in Collector(self.config, args.csv_jobs, cache).collect(
+            shared
+        ):
+            stats = needed.pop(exp.get_stdout())[1]
+            parsed[exp.get_stdout()] = dict(
+                (stat, str(sim_stats.get_stat(stat))) for stat in stats
+            )
+        if cache is not None:
+            cache.save()
+        return parsed
+
+    def __create_csv(self, experiments, params, stats, output, parsed=None):
+        args = self.config.get_args()
+        cache = None
+        if args.csv_cache and parsed is None:
+            cache = StatsCache(args.csv_cache, args.csv_cache_size)
+        rows = None
+        if args.csv_incremental and output:
+            # The rows are stored next to the output
+            rows = RowStore(output + ".rows", [params, stats])
         csv = CSV(
-            self.config, experiments=experiments, params_list=params, stats_list=stats
+            self.config,
+            experiments=experiments,
+            params_list=params,
+            stats_list=stats,
+            workers=args.csv_jobs,
+            cache=cache,
+            rows=rows,
+            spill_rows=args.csv_buffer,
+            aggregates=args.csv_aggregate,
+            parsed=parsed,
         )
-        if output:
-            with open(output, "w") as out:
-                csv.print_csv(out)
-        else:
-            csv.print_csv()
+        if cache is not None:
+            cache.save()
+        return csv
+
+    def __run_sql(self, csv, output, query, extra_files):
+        """
+        Runs the query on an in memory SQLite database
+
+        The rows are a table named after the output file (output for output.csv)
+        and every extra file is a table named after it too. Spaces and + in the
+        names become _, and columns holding only numbers are numeric
 
-    def __run_sql(self, output, query, extra_files):
+        Returns:
+            (list of str, list of tuple) : names of the columns of the result and its rows
+        """
         if type(query) is list:
             query = "".join(query)
-        os.system('sed "s/+/_/g" -i %s' % output)
-        os.system('sed "s/ /_/g" -i %s' % output)
-        extra_files = "".join(["-i %s" % file for file in extra_files])
-        qcsv_cmdline = 'querycsv.py -i %s %s -o %s "%s"' % (
-            output,
-            extra_files,
-            output,
-            query,
+        db = sqlite3.connect(":memory:")
+        self.__load_table(
+            db,
+            self.__table_name(output or "output"),
+            [name.replace("+", "_") for name in csv.headers()],
+            csv.rows(),
+        )
+        for extra_file in extra_files:
+            with open(extra_file, "r", newline="") as f:
+                lines = [
+                    [value.strip() for value in line] for line in stdcsv.reader(f) if line
+                ]
+            for number, line in enumerate(lines[1:], 2):
+                if len(line) != len(lines[0]):
+                    raise ValueError(
+                        "%s:%d has %d values, the header has %d"
+                        % (extra_file, number, len(line), len(lines[0]))
+                    )
+            self.__load_table(db, self.__table_name(extra_file), lines[0], lines[1:])
+
+        cursor = db.execute(query)
+        headers = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+        db.close()
+        return headers, rows
+
+    @staticmethod
+    def __table_name(path):
+        """
+        Returns:
+            str : name of the table holding the csv file in path
+        """
+        return re.sub(r"\W", "_", os.path.splitext(os.path.basename(path))[0])
+
+    @staticmethod
+    def __load_table(db, table, headers, rows):
+        """
+        Creates a table with the rows, columns whose values are all integers
+        or numbers are INTEGER or REAL. None and empty values are NULL
+
+        Args:
+            db (sqlite3.Connection) In : database
+            table (str) In             : name of the table
+            headers (list of str) In   : name of the columns
+            rows (iterable of list of str) In : values of every row
+        """
+        columns = [re.sub(r"\W", "_", name.strip()) for name in headers]
+        rows = [
+            [None if value in ("", "None") else value for value in row] for row in rows
+        ]
+        types = []
+        for i in range(len(columns)):
+            values = [row[i] for row in rows if i < len(row) and row[i] is not None]
+            for sql_type, convert in (("INTEGER", int), ("REAL", float)):
+                try:
+                    for value in values:
+                        convert(value)
+                except ValueError:
+                    continue
+                break
+            else:
+                sql_type, convert = "TEXT", str
+            types.append((sql_type, convert))
+
+        db.execute(
+            'CREATE TABLE "%s" (%s)'
+            % (
+                table,
+                ", ".join(
+                    '"%s" %s' % (column, sql_type)
+                    for column, (sql_type, _) in zip(columns, types)
+                ),
+            )
+        )
+        db.executemany(
+            'INSERT INTO "%s" VALUES (%s)' % (table, ", ".join("?" * len(columns))),
+            (
+                [
+                    None if value is None else convert(value)
+                    for value, (_, convert) in zip(row, types)
+                ]
+                + [None] * (len(columns) - len(row))
+                for row in rows
+            ),
         )
-        os.system("%s" % qcsv_cmdline)
-        os.system('sed "s/\\"//g" -i %s' % output)
 
 
 class CSV(object):
@@ -84,67 +283,201 @@ class CSV(object):
     Iterate through all the experiments folders getting the results
     """
 
-    def __init__(self, config, experiments, params_list, stats_list):
+    def __init__(
+        self,
+        config,
+        experiments,
+        params_list,
+        stats_list,
+        workers=None,
+        cache=None,
+        rows=None,
+        spill_rows=100000,
+        aggregates=None,
+        parsed=None,
+    ):
+        """
+        Args:
+            rows (RowStore) : Optional, stats values of the previous collection,
+                              only new or changed experiments are parsed
+            spill_rows (int) : rows held in memory before sorting them on disk
+            aggregates (list of str) : statistics of the stats over the experiments
+                                       of every row added as columns
+            parsed (dict) : stdout -> {stat -> value} of experiments already parsed,
+                            the rest are parsed by the collector
+        Attributes:
+            aggregator (Aggregator) : computes the aggregates, None without them
+            row_store (RowStore) : the rows argument
+            names (OrderedDict) : graph names, in the order they appear
+            data (RowBuilder) : the rows of the csv
+        """
         self.config = config
         self.experiments = experiments
         self.params_list = params_list
         self.stats_list = stats_list
-        self.names = []
+        self.collector = Collector(config, workers, cache)
+        self.row_store = rows
+        self.parsed = parsed or {}
+        self.spill_rows = spill_rows
+        self.aggregator = None
+        if aggregates:
+            self.aggregator = Aggregator(stats_list, aggregates)
+        self.names = OrderedDict()
         self.data = self.read_data(params_list, stats_list)
 
     def read_data(self, params_list, stats_list):
         """
-        Given a params list creates a dictionary
-        that obbeys the params_list hierachy in order
+        Given a params list groups the experiments by the values of
+        those params, following the params_list hierachy in order
         The param list should contain the parameters for the simulation
         The stats the statistics for the simulation
+
+        The stats of several experiments are extracted concurrently,
+        but they are inserted following the experiments order
+
+        Returns:
+            RowBuilder : the rows, sorted on disk when they are too many
         """
-        results = NestedDict()
-        for sim in self.experiments:
-            cur_level = results
-            for i, param in enumerate(params_list):
-                param_value = sim.get_param(param)
-                if i == (len(params_list) - 1):
-                    # Last level for this simulation, populate with stats
-                    if not (sim.get_graph_name() in self.names):
-                        self.names.append(sim.get_graph_name())
-                    if param_value in cur_level:
-                        cur_level[param_value] += self.__populate_stats(sim, stats_list)
-                    else:
-                        cur_level[param_value] = self.__populate_stats(sim, stats_list)
-                else:
-                    # advance one level
-                    cur_level = cur_level[param_value]
+        results = RowBuilder(self.spill_rows)
+        if not params_list:
+            return results
+        for sim, values in self.__collect(stats_list):
+            self.names[sim.get_graph_name()] = None
+            results.add(tuple(sim.get_param(param) for param in params_list), values)
 
         return results
 
-    def __populate_stats(self, sim, stats_list):
+    def __collect(self, stats_list):
+        """
+        Yields the stats values of every experiment in order. With a row
+        store only the experiments missing or outdated in it are parsed,
+        the store is saved with the rows of these experiments
+
+        Yields:
+            (Job, list of str) : each experiment with the values of its stats
+        """
+        if self.row_store is None:
+            for sim, values in self.__values(self.experiments, stats_list):
+                yield sim, values
+            return
+
+        experiments = list(self.experiments)
+        # Fingerprints are taken before parsing, a change while parsing is seen next time
+        keys = [
+            (
+                sim.get_stdout(),
+                StatsCache.fingerprint(sim.get_stdout()),
+                RowStore.digest(sim, stats_list),
+            )
+            for sim in experiments
+        ]
+        stale = [
+            (sim, key)
+            for sim, key in zip(experiments, keys)
+            if self.row_store.get(*key) is None
+        ]
+        parsed = self.__values([sim for sim, _ in stale], stats_list)
+        for (sim, values), (_, key) in zip(parsed, stale):
+            self.row_store.put(*(key + (values,)))
+        self.row_store.save(set(key[0] for key in keys))
+
+        for sim, key in zip(experiments, keys):
+            yield sim, self.row_store.get(*key)
+
+    def __values(self, experiments, stats_list):
+        """
+        Yields:
+            (Job, list of str) : each experiment with the values of its stats,
+                                 taken from the already parsed ones when possible
+        """
+        if not self.parsed:
+            for sim, sim_stats in self.collector.collect(experiments):
+                yield sim, self.__populate_stats(sim_stats, stats_list)
+            return
+
+        def known(sim):
+            values = self.parsed.get(sim.get_stdout())
+            return values is not None and all(stat in values for stat in stats_list)
+
+        experiments = list(experiments)
+        # The rest are parsed concurrently, in the same order
+        collected = self.collector.collect(sim for sim in experiments if not known(sim))
+        for sim in experiments:
+            if known(sim):
+                values = self.parsed[sim.get_stdout()]
+                yield sim, [values[stat] for stat in stats_list]
+            else:
+                yield sim, self.__populate_stats(next(collected)[1], stats_list)
+
+    def __populate_stats(self, sim_stats, stats_list):
         """
-        Given the dictionary, it populates with the stats
+        Given the stats of a simulation, returns the values in stats_list order
         """
-        sim_stats = self.config.get_model("stats").Stats(sim)
         st = [str(sim_stats.get_stat(stat)) for stat in stats_list]
         return st
 
-    def __print_headers(self, output):
+    def headers(self):
+        """
+        Returns:
+            list of str : the params, the aggregates and the graph names when
+                          there is a single stat, or the stats otherwise
+        """
+        headers = list(self.params_list)
+        # Aggregates go before the values, rows may have more values than headers
+        if self.aggregator is not None:
+            headers += self.aggregator.headers()
+        return headers + self.value_headers()
+
+    def value_headers(self):
+        """
+        Returns:
+            list of str : the graph names when there is a single stat, or the stats
+        """
         if len(self.stats_list) == 1:
-            print(",".join((self.params_list + self.names)), file=output)
-        else:
-            print(",".join((self.params_list + self.stats_list)), file=output)
+            return list(self.names)
+        return list(self.stats_list)
 
-    def print_csv(self, output=None):
-        cur_level = self.data
-        self.__print_headers(output)
-        for key in cur_level:
-            self.__print_csv_aux(cur_level[key], [key], output)
+    def rows(self, block=4096):
+        """
+        Args:
+            block (int) In : rows aggregated at once
+        Yields:
+            list of str : the values of every line of the csv
+        """
+        if self.aggregator is None:
+            for key, values in self.data:
+                yield [str(value) for value in key] + [str(value) for value in values]
+            return
 
-    def __print_csv_aux(self, cur_level, csv_line=[], output=None):
+        rows = []
+        for row in self.data:
+            rows.append(row)
+            if len(rows) == block:
+                for line in self.__aggregate(rows):
+                    yield line
+                rows = []
+        if rows:
+            for line in self.__aggregate(rows):
+                yield line
 
-        if type(cur_level) is list:
-            csv_line = [str(line) for line in csv_line]
-            cur_level = [str(x) for x in cur_level]
-            print(",".join(csv_line + cur_level), file=output)
-            return
+    def __aggregate(self, rows):
+        """
+        Returns:
+            list of list of str : lines of the rows with their aggregates
+        """
+        aggregates = self.aggregator.aggregate([values for _, values in rows])
+        return [
+            [str(value) for value in key]
+            + [str(value) for value in aggregates[i]]
+            + [str(value) for value in values]
+            for i, (key, values) in enumerate(rows)
+        ]
+
+    def close(self):
+        """ Removes the temporary files of the rows """
+        self.data.close()
 
-        for key in cur_level:
-            self.__print_csv_aux(cur_level[key], csv_line + [key], output)
+    def print_csv(self, output=None):
+        print(",".join(self.headers()), file=output)
+        for row in self.rows():
+            print(",".join(row), file=output)
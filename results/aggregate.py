@@ -0,0 +1,145 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import re
+import warnings
+
+import numpy as np
+
+from results.columnar import to_number
+
+# Two sided 95% quantiles of the t distribution by degrees of freedom
+t_975 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+
+class UnknownAggregate(Exception):
+    pass
+
+
+def ci95(values):
+    """
+    Returns:
+        array : half width of the 95% confidence interval of the mean of every row
+    """
+    n = np.sum(~np.isnan(values), axis=1)
+    t = np.array([t_975[min(k, len(t_975)) - 1] if k > 0 else np.nan for k in n - 1])
+    # Beyond the table the normal quantile is close enough
+    t[n - 1 > len(t_975)] = 1.96
+    return t * np.nanstd(values, axis=1, ddof=1) / np.sqrt(n)
+
+
+functions = {
+    "mean": lambda values: np.nanmean(values, axis=1),
+    "median": lambda values: np.nanmedian(values, axis=1),
+    "std": lambda values: np.nanstd(values, axis=1, ddof=1),
+    "min": lambda values: np.nanmin(values, axis=1),
+    "max": lambda values: np.nanmax(values, axis=1),
+    "ci95": ci95,
+}
+
+
+def get_function(name):
+    """
+    Args:
+        name (str) In : mean, median, std, min, max, ci95 or pNN for the NN percentile
+    Returns:
+        function : computes the aggregate of every row of a rows x values array
+    """
+    if name in functions:
+        return functions[name]
+    percentile = re.match(r"^p(\d+(\.\d+)?)$", name)
+    if percentile and float(percentile.group(1)) <= 100:
+        q = float(percentile.group(1))
+        return lambda values: np.nanpercentile(values, q, axis=1)
+    raise UnknownAggregate("Unknown aggregate %s" % name)
+
+
+class Aggregator(object):
+    """
+    Computes statistics of the values of every stat over the experiments
+    joined in each row, such as the repetitions of an experiment
+
+    Rows are processed in blocks as a rows x experiments x stats array,
+    rows with fewer experiments are padded with NaN, as are the values
+    that are not numbers
+    """
+
+    def __init__(self, stats_list, aggregates):
+        """
+        Args / Attributes:
+            stats_list (list of str) : stats of every experiment of a row, in order
+            aggregates (list of str) : statistics to compute
+        Attributes:
+            functions (list of function) : the function of every aggregate
+        """
+        self.stats_list = stats_list
+        self.aggregates = aggregates
+        self.functions = [get_function(name) for name in aggregates]
+
+    def headers(self):
+        """
+        Returns:
+            list of str : name of the columns, stat_aggregate for every stat and aggregate
+        """
+        return [
+            "%s_%s" % (stat, name) for stat in self.stats_list for name in self.aggregates
+        ]
+
+    def aggregate(self, rows):
+        """
+        Args:
+            rows (list of list) In : values of the stats of every experiment of each row
+        Returns:
+            array : rows x (stats x aggregates) array with the columns of headers
+        """
+        nstats = len(self.stats_list)
+        width = max([len(row) for row in rows] + [nstats]) // nstats
+        values = np.array(
+            [
+                [to_number(value) for value in row]
+                + [np.nan] * (width * nstats - len(row))
+                for row in rows
+            ],
+            dtype=np.float64,
+        )
+        # rows x experiments x stats
+        values = values.reshape(len(rows), width, nstats)
+
+        columns = []
+        with warnings.catch_warnings():
+            # Rows without values are NaN
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            for s in range(nstats):
+                for function in self.functions:
+                    columns.append(function(values[:, :, s]))
+        return np.column_stack(columns) if columns else np.empty((len(rows), 0))
@@ -0,0 +1,139 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class StatsCache(object):
+    """
+    On disk cache of the parsed stats values
+
+    Values are stored per experiment and per stat command, and they are
+    only valid while the experiment stdout keeps the same size and mtime.
+    When the cache grows over max_entries the experiments that were used
+    longer ago are evicted
+    """
+
+    def __init__(self, path, max_entries=100000):
+        """
+        Args / Attributes:
+            path (str)        : json file holding the cache
+            max_entries (int) : maximum number of experiments kept in the cache
+        Attributes:
+            entries (dict) : stdout -> {"fingerprint", "used", "stats" : {cmd hash -> values}}
+            stamp (float)  : time of this collection, used to evict old entries
+        """
+        self.path = os.path.expandvars(os.path.expanduser(path))
+        self.max_entries = max_entries
+        self.entries = {}
+        self.stamp = time.time()
+        self.lock = threading.Lock()
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                # A corrupted cache is just discarded
+                self.entries = {}
+
+    @staticmethod
+    def fingerprint(path):
+        """
+        Returns:
+            list : size and mtime of path, None when it does not exist
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime_ns]
+
+    @staticmethod
+    def digest(cmd):
+        """
+        Args:
+            cmd (str or dict) In : stat command or rule as written in the json file
+        Returns:
+            str : hash identifying the command
+        """
+        return hashlib.sha1(json.dumps(cmd, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key, fingerprint, cmd):
+        """
+        Args:
+            key (str) In           : experiment stdout
+            fingerprint (list) In  : current fingerprint of the stdout
+            cmd (str or dict) In   : stat command
+        Returns:
+            list : cached values of the stat, None if they are missing or outdated
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return None
+        entry["used"] = self.stamp
+        return entry["stats"].get(self.digest(cmd))
+
+    def put(self, key, fingerprint, cmd, values):
+        """
+        Stores the values of a stat, outdated values of the experiment are dropped
+
+        Args:
+            key (str) In          : experiment stdout
+            fingerprint (list) In : current fingerprint of the stdout
+            cmd (str or dict) In  : stat command
+            values (list) In      : parsed values of the stat
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["fingerprint"] != fingerprint:
+                entry = {"fingerprint": fingerprint, "stats": {}}
+                self.entries[key] = entry
+            entry["used"] = self.stamp
+            entry["stats"][self.digest(cmd)] = list(values)
+
+    def save(self):
+        """ Evicts the least recently used experiments and writes the cache """
+        if len(self.entries) > self.max_entries:
+            keep = sorted(
+                self.entries, key=lambda k: self.entries[k]["used"], reverse=True
+            )[: self.max_entries]
+            self.entries = dict((k, self.entries[k]) for k in keep)
+
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # Write a new file and move it so an interrupted save keeps the old cache
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
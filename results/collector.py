@@ -0,0 +1,87 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+
+
+class Collector(object):
+    """
+    Extracts the stats of many experiments at once
+
+    Stats commands spend most of their time waiting for the shell
+    and the filesystem, so a pool of threads keeps several of them
+    in flight while results are still returned in experiment order
+    """
+
+    def __init__(self, config, workers=None, cache=None):
+        """
+        Args / Attributes:
+            config (config obj) : Global configuration of batcher
+            workers (int)       : Number of experiments parsed concurrently,
+                                  defaults to the number of cores
+            cache (StatsCache)  : Optional, cache of already parsed stats
+        """
+        self.config = config
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = cache
+
+    def collect(self, experiments):
+        """
+        Reads the stats of every experiment
+
+        Only a bounded window of experiments is in flight at any time
+        so the experiments can be a generator
+
+        Args:
+            experiments (iterable of Job) In : experiments to get the stats from
+        Yields:
+            (Job, Stats) : each experiment with its stats, in the input order
+        """
+        stats_class = self.config.get_model("stats").Stats
+        if self.cache is not None:
+            stats_class = functools.partial(stats_class, cache=self.cache)
+
+        if self.workers == 1:
+            for exp in experiments:
+                yield exp, stats_class(exp)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque([])
+            for exp in experiments:
+                pending.append((exp, pool.submit(stats_class, exp)))
+                if len(pending) >= 4 * self.workers:
+                    exp, future = pending.popleft()
+                    yield exp, future.result()
+            while pending:
+                exp, future = pending.popleft()
+                yield exp, future.result()
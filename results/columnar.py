@@ -0,0 +1,154 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+def to_number(value):
+    """
+    Returns:
+        float : the value as a number, NaN when it is missing or not a number
+    """
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_columns(headers, rows, keys=None, fixed=None):
+    """
+    Turns the rows in typed columns. Categorical columns are dictionary
+    encoded as the int32 index of every value in the sorted array of their
+    distinct values, the rest are float64 with NaN for missing values
+
+    Rows longer than the headers repeat the columns after the fixed ones,
+    as rows with several experiments do, and the repeated columns get a
+    _N suffix
+
+    Args:
+        headers (list of str) In   : names of the columns
+        rows (iterable of list) In : values of every row
+        keys (int) In              : Optional, number of leading columns to dictionary
+                                     encode, by default the ones that are not numbers
+        fixed (int) In             : Optional, number of leading columns that are not
+                                     repeated, keys by default
+    Returns:
+        OrderedDict : name -> float64 array or (int32 codes array, values array)
+    """
+    rows = list(rows)
+    width = max([len(headers)] + [len(row) for row in rows])
+    names = list(headers)
+    first = fixed if fixed is not None else keys or 0
+    repeated = len(headers) - first
+    for i in range(len(headers), width):
+        names.append(
+            "%s_%d" % (headers[first + (i - first) % repeated], (i - first) // repeated)
+        )
+
+    columns = OrderedDict()
+    for i, name in enumerate(names):
+        values = [
+            None if i >= len(row) or row[i] in (None, "", "None") else row[i]
+            for row in rows
+        ]
+        numbers = np.array([to_number(value) for value in values], dtype=np.float64)
+        if keys is not None:
+            is_categorical = i < keys
+        else:
+            is_categorical = any(
+                value is not None and np.isnan(number)
+                for value, number in zip(values, numbers)
+            )
+        if not is_categorical:
+            columns[name] = numbers
+            continue
+        distinct, codes = np.unique(
+            np.array(["" if value is None else str(value) for value in values]),
+            return_inverse=True,
+        )
+        # Keep the values typed when all of them are numbers
+        if not np.isnan([to_number(value) for value in distinct]).any():
+            as_float = distinct.astype(np.float64)
+            distinct = as_float
+            if (as_float == np.round(as_float)).all():
+                distinct = as_float.astype(np.int64)
+        columns[name] = (codes.astype(np.int32), distinct)
+    return columns
+
+
+def write_npz(path, columns):
+    """
+    Writes the columns in an uncompressed npz file, numpy loads every column
+    only when accessed. A dictionary encoded column is stored as name with
+    the codes and name.values with the distinct values
+
+    Args:
+        path (str) In            : file to write
+        columns (OrderedDict) In : columns as built by build_columns
+    """
+    arrays = OrderedDict()
+    for name, column in columns.items():
+        if type(column) is tuple:
+            arrays[name], arrays[name + ".values"] = column
+        else:
+            arrays[name] = column
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def write_parquet(path, columns):
+    """
+    Writes the columns in a parquet file, dictionary encoded columns
+    are arrow dictionary arrays. Requires pyarrow
+
+    Args:
+        path (str) In            : file to write
+        columns (OrderedDict) In : columns as built by build_columns
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow is required to write parquet files")
+
+    arrays = []
+    for column in columns.values():
+        if type(column) is tuple:
+            codes, values = column
+            arrays.append(pa.DictionaryArray.from_arrays(codes, values))
+        else:
+            arrays.append(pa.array(column, type=pa.float64()))
+    pq.write_table(pa.Table.from_arrays(arrays, names=list(columns)), path)
+
+
+writers = {"npz": write_npz, "parquet": write_parquet}
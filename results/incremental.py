@@ -0,0 +1,115 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import json
+import os
+
+from results.cache import StatsCache
+
+
+class RowStore(object):
+    """
+    Rows of an output file kept next to it, so later collections
+    only parse the experiments that finished or changed since
+
+    Every experiment keeps the values of its stats along with the
+    fingerprint of its stdout and the digest of the stats commands,
+    any change in either makes the experiment to be parsed again.
+    Changing the params or stats columns discards the whole store
+    """
+
+    def __init__(self, path, columns):
+        """
+        Args:
+            path (str)     : json file holding the rows
+            columns (list) : params and stats of the output
+        Attributes:
+            path (str)     : json file holding the rows
+            columns (list) : params and stats of the output
+            rows (dict)    : stdout -> {"fingerprint", "digest", "values"}
+        """
+        self.path = path
+        self.columns = columns
+        self.rows = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                if data["columns"] == columns:
+                    self.rows = data["rows"]
+            except (ValueError, KeyError):
+                # A corrupted store is just discarded
+                self.rows = {}
+
+    @staticmethod
+    def digest(exp, stats_list):
+        """
+        Returns:
+            str : hash identifying the commands of the stats of the experiment
+        """
+        stats = exp.get_stats()
+        return StatsCache.digest([stats.get(stat) for stat in stats_list])
+
+    def get(self, key, fingerprint, digest):
+        """
+        Args:
+            key (str) In          : experiment stdout
+            fingerprint (list) In : current fingerprint of the stdout
+            digest (str) In       : current digest of the stats commands
+        Returns:
+            list : values of the stats, None if they are missing or outdated
+        """
+        row = self.rows.get(key)
+        if row is None or row["fingerprint"] != fingerprint or row["digest"] != digest:
+            return None
+        return row["values"]
+
+    def put(self, key, fingerprint, digest, values):
+        """
+        Args:
+            key (str) In          : experiment stdout
+            fingerprint (list) In : fingerprint of the stdout the values come from
+            digest (str) In       : digest of the stats commands
+            values (list) In      : values of the stats
+        """
+        self.rows[key] = {"fingerprint": fingerprint, "digest": digest, "values": values}
+
+    def save(self, keys=None):
+        """
+        Writes the store
+
+        Args:
+            keys (set) In : Optional, experiments to keep, the rest are dropped
+        """
+        if keys is not None:
+            self.rows = dict((k, v) for k, v in self.rows.items() if k in keys)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"columns": self.columns, "rows": self.rows}, f)
+        os.replace(tmp_path, self.path)
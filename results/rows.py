@@ -0,0 +1,233 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import heapq
+import pickle
+import tempfile
+
+
+class RowBuilder(object):
+    """
+    Groups the stats values of the experiments by their key, the values
+    of the params of the output, without keeping them all in memory
+
+    Rows are sorted as a tree of the key values would be: by the first
+    value in the order it first appeared, then by the second value in the
+    order it first appeared after that first value and so on. Experiments
+    with the same key are joined in one row in the order they were added
+
+    Nothing grows with the rows in memory. The experiments are sorted by
+    key in runs written to temporary files every spill_rows experiments.
+    Merging them joins the experiments of every key and finds where each
+    key prefix first appeared. A second sort on those positions gives
+    the tree order
+    """
+
+    def __init__(self, spill_rows=100000):
+        """
+        Args / Attributes:
+            spill_rows (int) : rows held in memory before writing them to a run
+        Attributes:
+            buffer (list)     : (order, sequence, key, values) not written yet
+            runs (list of file) : temporary files with the sorted runs of the experiments
+            files (list of file) : temporary files of the iterations over the rows
+            sequence (int)    : rows added so far
+        """
+        self.spill_rows = spill_rows
+        self.buffer = []
+        self.runs = []
+        self.files = []
+        self.sequence = 0
+
+    @staticmethod
+    def __order(key):
+        """
+        Returns:
+            tuple : sortable form of the key, equal keys are equal and values
+                    of different types are never compared
+        """
+        return tuple(
+            (0, value)
+            if type(value) in (int, float, bool)
+            else (1, value)
+            if type(value) is str
+            else (2, repr(value))
+            for value in key
+        )
+
+    def add(self, key, values):
+        """
+        Args:
+            key (tuple) In   : values of the params of the experiment
+            values (list) In : values of its stats
+        """
+        self.buffer.append((self.__order(key), self.sequence, key, values))
+        self.sequence += 1
+        if len(self.buffer) >= self.spill_rows:
+            self.buffer.sort()
+            self.runs.append(self.__write_run(self.buffer))
+            self.buffer = []
+
+    def __write_run(self, records, run=None):
+        """
+        Writes the records in blocks, so they are read without
+        unpickling every record on its own
+
+        Args:
+            records (iterable of tuple) In : records to write
+            run (file) In                  : Optional, file to append them to
+        Returns:
+            file : temporary file with the records
+        """
+        if run is None:
+            run = tempfile.TemporaryFile()
+        block = []
+        for record in records:
+            block.append(record)
+            if len(block) >= 1024:
+                pickle.dump(block, run, pickle.HIGHEST_PROTOCOL)
+                block = []
+        if block:
+            pickle.dump(block, run, pickle.HIGHEST_PROTOCOL)
+        return run
+
+    @staticmethod
+    def __read_run(run):
+        run.seek(0)
+        while True:
+            try:
+                block = pickle.load(run)
+            except EOFError:
+                return
+            for record in block:
+                yield record
+
+    def __sort(self, records):
+        """
+        Sorts the records spilling runs to temporary files
+
+        Args:
+            records (iterable of tuple) In : records with unique leading fields
+        Returns:
+            iterator of tuple : the records sorted
+        """
+        runs = []
+        buffer = []
+        for record in records:
+            buffer.append(record)
+            if len(buffer) >= self.spill_rows:
+                buffer.sort()
+                runs.append(self.__write_run(buffer))
+                buffer = []
+        self.files.extend(runs)
+        buffer.sort()
+        return heapq.merge(*([self.__read_run(run) for run in runs] + [iter(buffer)]))
+
+    def __joined(self, firsts):
+        """
+        Joins the experiments sharing a key. The prefixes of a key are contiguous
+        in key order, so the first appearance of each one is known when its group
+        ends, and it is written to the file of its depth
+
+        Args:
+            firsts (list of file) Out : first appearance of the prefixes of every depth
+        Yields:
+            (tuple, tuple, list) : sortable form of every distinct key in key order,
+                                   the key and the values of all its experiments
+        """
+        self.buffer.sort()
+        # Sequences are unique, so records are ordered by key and sequence alone
+        records = heapq.merge(
+            *([self.__read_run(run) for run in self.runs] + [iter(self.buffer)])
+        )
+        # [prefix, first appearance] of the groups the last key belongs to
+        groups = []
+        ended = []
+        order, key, values = None, None, []
+        for record in records:
+            if record[0] == order:
+                values.extend(record[3])
+                continue
+            if order is not None:
+                yield order, key, values
+            order, key, values = record[0], record[2], list(record[3])
+            first = record[1]
+            if not firsts:
+                firsts.extend(tempfile.TemporaryFile() for _ in order)
+                ended = [[] for _ in order]
+            depth = 0
+            while depth < len(groups) and groups[depth][0] == order[depth]:
+                groups[depth][1] = min(groups[depth][1], first)
+                depth += 1
+            for i in range(depth, len(groups)):
+                ended[i].append(groups[i][1])
+                if len(ended[i]) >= 1024:
+                    self.__write_run(ended[i], firsts[i])
+                    ended[i] = []
+            groups = groups[:depth] + [[order[i], first] for i in range(depth, len(order))]
+        if order is not None:
+            yield order, key, values
+        for i, group in enumerate(groups):
+            ended[i].append(group[1])
+            self.__write_run(ended[i], firsts[i])
+
+    def __iter__(self):
+        """
+        Yields:
+            (tuple, list) : the key of every row and the values of all its experiments
+        """
+        firsts = []
+        joined = self.__write_run(self.__joined(firsts))
+        self.files.append(joined)
+        self.files.extend(firsts)
+
+        def ranked():
+            # Every row takes the first appearance of the groups it starts
+            readers = [self.__read_run(f) for f in firsts]
+            ranks = []
+            previous = None
+            for order, key, values in self.__read_run(joined):
+                depth = 0
+                if previous is not None:
+                    while depth < len(order) and order[depth] == previous[depth]:
+                        depth += 1
+                ranks = ranks[:depth] + [next(readers[i]) for i in range(depth, len(order))]
+                previous = order
+                yield tuple(ranks), key, values
+
+        # The rank of the whole key is the sequence of its first experiment, so ranks are unique
+        for _, key, values in self.__sort(ranked()):
+            yield key, values
+
+    def close(self):
+        """ Removes the temporary files """
+        for run in self.runs + self.files:
+            run.close()
+        self.runs = []
+        self.files = []
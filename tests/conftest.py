@@ -0,0 +1,117 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import os
+import sys
+
+# The tests import the packages of the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import walltime
+
+
+class FakeJob(object):
+    """
+    Experiment with the getters of a Job, the tests set the ones they read
+
+    Args / Attributes:
+        name (str)      : name of the experiment, exported as $EXP by its env
+        directory (str) : working dir holding its stdout and job script
+        params (dict)   : param sample
+        seconds (int)   : wall time in seconds
+        nodes (int)     : nodes requested
+        slots (int)     : slots requested
+        bin (str)       : cmdline
+        stats (dict)    : stats commands
+        model (str)     : model of the experiment
+    """
+
+    def __init__(
+        self,
+        name="exp",
+        directory="",
+        params=None,
+        seconds=60,
+        nodes=1,
+        slots=1,
+        bin="echo $EXP",
+        stats=None,
+        model="base",
+    ):
+        self.name = name
+        self.directory = str(directory)
+        self.param_sample = params or {}
+        self.seconds = seconds
+        self.nodes = nodes
+        self.slots = slots
+        self.bin = bin
+        self.stats = stats or {}
+        self.experiment = {"model": model, "bin": [bin]}
+
+    def get_name(self):
+        return self.name
+
+    def get_env(self):
+        return "export EXP=%s" % self.name
+
+    def get_app_dir(self):
+        return ""
+
+    def get_working_dir(self):
+        return self.directory
+
+    def get_cmd_line(self):
+        return self.bin
+
+    def get_stdout(self):
+        return os.path.join(self.directory, self.name + ".out")
+
+    def get_job_script_path(self):
+        return os.path.join(self.directory, self.name + ".job")
+
+    def get_wall_time(self):
+        return walltime.to_string(self.seconds)
+
+    def get_nodes(self):
+        return self.nodes
+
+    def get_slots(self):
+        return self.slots
+
+    def get_param(self, param):
+        return self.param_sample[param]
+
+    def get_stats(self):
+        return self.stats
+
+    def get_experiments(self):
+        return [self]
+
+    def __repr__(self):
+        return self.name
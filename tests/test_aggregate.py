@@ -0,0 +1,73 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import numpy as np
+import pytest
+
+from results.aggregate import Aggregator, UnknownAggregate, get_function
+
+
+def test_headers():
+    aggregator = Aggregator(["time", "energy"], ["mean", "p90"])
+    assert aggregator.headers() == ["time_mean", "time_p90", "energy_mean", "energy_p90"]
+
+
+def test_aggregates_per_stat():
+    aggregator = Aggregator(["time", "energy"], ["mean", "min", "max", "median"])
+    rows = [["1", "10", "3", "30", "2", "20"], ["4", "x"]]
+    result = aggregator.aggregate(rows)
+    assert result.shape == (2, 8)
+    assert list(result[0]) == [2, 1, 3, 2, 20, 10, 30, 20]
+    # Short rows are padded and values that are not numbers ignored
+    assert list(result[1][:4]) == [4, 4, 4, 4]
+    assert np.isnan(result[1][4:]).all()
+
+
+def test_std_and_ci95():
+    aggregator = Aggregator(["time"], ["std", "ci95"])
+    result = aggregator.aggregate([["1", "3"], ["2", "4", "6"], ["5"]])
+    assert result[0][0] == pytest.approx(np.sqrt(2))
+    # 2 experiments have 1 degree of freedom
+    assert result[0][1] == pytest.approx(12.706 * np.sqrt(2) / np.sqrt(2))
+    assert result[1][1] == pytest.approx(4.303 * 2 / np.sqrt(3))
+    assert np.isnan(result[2]).all()
+
+
+def test_ci95_large_samples():
+    values = [str(v) for v in range(100)]
+    result = Aggregator(["time"], ["ci95"]).aggregate([values])
+    assert result[0][0] == pytest.approx(1.96 * np.std(range(100), ddof=1) / 10)
+
+
+def test_percentiles_and_unknown():
+    assert get_function("p50")(np.array([[1.0, 2.0, 3.0]]))[0] == 2
+    assert get_function("p99.5")(np.array([[0.0, 200.0]]))[0] == pytest.approx(199)
+    for name in ("p101", "sum", "p"):
+        with pytest.raises(UnknownAggregate):
+            get_function(name)
@@ -0,0 +1,120 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import os
+import stat
+import subprocess
+
+from conftest import FakeJob
+from hosts.gridengine import GridEngine
+from hosts.slurm import Slurm
+
+
+def array_job(tmpdir, name):
+    """ Job of an array writing its name """
+    return FakeJob(name, tmpdir, seconds=3600, nodes=2, bin="echo $EXP\necho done")
+
+
+def fake_command(tmpdir, monkeypatch, name, output):
+    """ Puts in the PATH a command printing output and saving its arguments """
+    fake = tmpdir.join("bin", name)
+    fake.write(
+        "#!/bin/bash\necho \"$@\" > %s\necho '%s'\n" % (tmpdir.join(name + ".args"), output),
+        ensure=True,
+    )
+    os.chmod(str(fake), stat.S_IRWXU)
+    monkeypatch.setenv("PATH", "%s:%s" % (tmpdir.join("bin"), os.environ["PATH"]))
+
+
+def dispatch(script, task_id, variable):
+    """ Runs the array script as the given task """
+    env = dict(os.environ)
+    env[variable] = str(task_id)
+    subprocess.check_call(["bash", script], env=env)
+
+
+def test_slurm_array(tmpdir, monkeypatch):
+    fake_command(tmpdir, monkeypatch, "sbatch", "Submitted batch job 42")
+    jobs = [array_job(tmpdir, "e%d" % i) for i in range(3)]
+    host = Slurm(
+        {"partition": "p", "account": "a", "array": True, "array_throttle": 2}
+    )
+    submitted = list(host.run_jobs(jobs))
+    assert submitted == [(job, "42_%d" % i) for i, job in enumerate(jobs, 1)]
+
+    script = tmpdir.join("sbatch.args").read().split()[-1]
+    lines = open(script).read().splitlines()
+    assert "#SBATCH --array=1-3%2" in lines
+    assert "#SBATCH -N 2" in lines
+    assert "#SBATCH -t 01:00:00" in lines
+
+    dispatch(script, 2, "SLURM_ARRAY_TASK_ID")
+    assert open(jobs[1].get_stdout()).read() == "e1\ndone\n"
+    assert not os.path.exists(jobs[0].get_stdout())
+
+
+def test_slurm_array_without_throttle(tmpdir, monkeypatch):
+    fake_command(tmpdir, monkeypatch, "sbatch", "Submitted batch job 42")
+    host = Slurm({"partition": "p", "account": "a", "array": True})
+    list(host.run_jobs([array_job(tmpdir, "e0"), array_job(tmpdir, "e1")]))
+    script = tmpdir.join("sbatch.args").read().split()[-1]
+    assert "#SBATCH --array=1-2" in open(script).read().splitlines()
+
+
+def test_gridengine_array(tmpdir, monkeypatch):
+    fake_command(
+        tmpdir,
+        monkeypatch,
+        "qsub",
+        'Your job-array 123.1-3:1 ("e0") has been submitted',
+    )
+    jobs = [array_job(tmpdir, "e%d" % i) for i in range(3)]
+    host = GridEngine({"queue": "q", "array": True, "array_throttle": 2})
+    submitted = list(host.run_jobs(jobs))
+    assert submitted == [(job, "123.%d" % i) for i, job in enumerate(jobs, 1)]
+
+    args = tmpdir.join("qsub.args").read().split()
+    assert args[:2] == ["-l", "q"]
+    lines = open(args[-1]).read().splitlines()
+    assert "#$ -t 1-3" in lines
+    assert "#$ -tc 2" in lines
+
+    dispatch(args[-1], 3, "SGE_TASK_ID")
+    assert open(jobs[2].get_stdout()).read() == "e2\ndone\n"
+    assert not os.path.exists(jobs[0].get_stdout())
+
+
+def test_gridengine_array_without_throttle(tmpdir, monkeypatch):
+    fake_command(
+        tmpdir, monkeypatch, "qsub", 'Your job-array 7.1-1:1 ("e0") has been submitted'
+    )
+    host = GridEngine({"queue": "q", "array": True})
+    assert list(host.run_jobs([array_job(tmpdir, "e0")]))[0][1] == "7.1"
+    script = tmpdir.join("qsub.args").read().split()[-1]
+    assert not any(line.startswith("#$ -tc") for line in open(script))
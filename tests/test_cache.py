@@ -0,0 +1,76 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import os
+
+from results.cache import StatsCache
+
+
+def test_get_and_put(tmpdir):
+    out = tmpdir.join("exp.out")
+    out.write("time 3\n")
+    cache = StatsCache(str(tmpdir.join("cache.json")))
+    fingerprint = StatsCache.fingerprint(str(out))
+    assert cache.get(str(out), fingerprint, "grep time") is None
+    cache.put(str(out), fingerprint, "grep time", ["3"])
+    assert cache.get(str(out), fingerprint, "grep time") == ["3"]
+    assert cache.get(str(out), fingerprint, {"regex": "time"}) is None
+
+
+def test_outdated_output(tmpdir):
+    out = tmpdir.join("exp.out")
+    out.write("time 3\n")
+    cache = StatsCache(str(tmpdir.join("cache.json")))
+    cache.put(str(out), StatsCache.fingerprint(str(out)), "grep time", ["3"])
+    out.write("time 3\ntime 4\n")
+    fingerprint = StatsCache.fingerprint(str(out))
+    assert cache.get(str(out), fingerprint, "grep time") is None
+    # New values drop the ones of the old output
+    cache.put(str(out), fingerprint, "grep other", ["1"])
+    assert list(cache.entries[str(out)]["stats"]) == [StatsCache.digest("grep other")]
+    assert StatsCache.fingerprint(str(tmpdir.join("missing"))) is None
+
+
+def test_save_evicts_old_entries(tmpdir):
+    path = str(tmpdir.join("dir", "cache.json"))
+    cache = StatsCache(path, max_entries=2)
+    for i, stamp in enumerate([3, 1, 2]):
+        cache.stamp = stamp
+        cache.put("exp%d" % i, [i, 0], "cmd", [str(i)])
+    cache.save()
+    loaded = StatsCache(path)
+    assert sorted(loaded.entries) == ["exp0", "exp2"]
+    assert loaded.get("exp0", [0, 0], "cmd") == ["0"]
+
+
+def test_corrupted_cache(tmpdir):
+    path = tmpdir.join("cache.json")
+    path.write("{broken")
+    assert StatsCache(str(path)).entries == {}
+    assert not os.path.exists(str(path) + ".tmp")
@@ -0,0 +1,87 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import numpy as np
+import pytest
+
+from results import columnar
+
+
+def test_typed_columns():
+    columns = columnar.build_columns(
+        ["app", "nodes", "time"],
+        [["b", "2", "1.5"], ["a", "4", "None"], ["b", "2", ""]],
+        keys=2,
+    )
+    assert list(columns) == ["app", "nodes", "time"]
+    codes, values = columns["app"]
+    assert list(values) == ["a", "b"]
+    assert list(codes) == [1, 0, 1]
+    codes, values = columns["nodes"]
+    assert values.dtype == np.int64
+    assert list(values[codes]) == [2, 4, 2]
+    assert columns["time"][0] == 1.5
+    assert np.isnan(columns["time"][1:]).all()
+
+
+def test_detected_keys():
+    columns = columnar.build_columns(["app", "time"], [["a", "1"], ["b", "x"]])
+    assert type(columns["app"]) is tuple
+    assert type(columns["time"]) is tuple
+    columns = columnar.build_columns(["app", "time"], [["1", "1"], ["2", None]])
+    assert columns["app"].dtype == np.float64
+
+
+def test_repeated_columns():
+    headers = ["app", "mean", "time", "energy"]
+    rows = [["a", "1", "1", "10", "2", "20"], ["b", "2", "3", "30"]]
+    columns = columnar.build_columns(headers, rows, keys=1, fixed=2)
+    assert list(columns) == ["app", "mean", "time", "energy", "time_1", "energy_1"]
+    assert list(columns["mean"]) == [1, 2]
+    assert columns["time_1"][0] == 2
+    assert np.isnan(columns["energy_1"][1])
+
+
+def test_write_npz(tmpdir):
+    columns = columnar.build_columns(["app", "time"], [["a", "1"], ["b", "2"]], keys=1)
+    path = str(tmpdir.join("out.npz"))
+    columnar.writers["npz"](path, columns)
+    data = np.load(path)
+    assert list(data["app.values"][data["app"]]) == ["a", "b"]
+    assert list(data["time"]) == [1, 2]
+
+
+def test_write_parquet(tmpdir):
+    pq = pytest.importorskip("pyarrow.parquet")
+    columns = columnar.build_columns(["app", "time"], [["a", "1"], ["b", None]], keys=1)
+    path = str(tmpdir.join("out.parquet"))
+    columnar.writers["parquet"](path, columns)
+    table = pq.read_table(path).to_pydict()
+    assert table["app"] == ["a", "b"]
+    assert table["time"][0] == 1
@@ -0,0 +1,83 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import pytest
+
+from core.constraints import Constraints
+from core.samplers import GridSampler
+
+
+def grid(params, constraints):
+    experiment = {"params": params, "constraints": constraints}
+    return list(GridSampler(experiment, None, {}).sample())
+
+
+def test_constraint_levels():
+    constraints = Constraints(["b > a", "c == 1", "True"], ["a", "b", "c"])
+    assert constraints.last_level() == 3
+    assert len(constraints.levels[0]) == 1
+    assert len(constraints.levels[2]) == 1
+    assert constraints.check({"a": 1, "b": 2}, 2)
+    assert not constraints.check({"a": 2, "b": 1}, 2)
+    assert constraints.is_valid({"a": 1, "b": 2, "c": 1})
+    assert not constraints.is_valid({"a": 1, "b": 2, "c": 0})
+
+
+def test_constraint_generator_expression():
+    constraints = Constraints(["any(c > x for x in [1])"], ["c"])
+    assert constraints.levels[1]
+    assert constraints.is_valid({"c": 2})
+    assert not constraints.is_valid({"c": 1})
+
+
+def test_constraint_restricted_builtins():
+    constraints = Constraints(["open('x') is None"], ["a"])
+    with pytest.raises(NameError):
+        constraints.is_valid({"a": 1})
+
+
+def test_grid_prunes_combinations():
+    found = grid({"a": [1, 2, 3], "b": [1, 2, 3], "c": [0, 1]}, ["b > a"])
+    assert len(found) == 6
+    assert all(param_set["b"] > param_set["a"] for param_set in found)
+
+
+def test_grid_without_constraints():
+    found = grid({"a": [1, 2], "b": 5}, [])
+    assert found == [{"a": 1, "b": 5}, {"a": 2, "b": 5}]
+
+
+def test_grid_empty_param_list():
+    assert grid({"a": [], "c": [1, 2]}, ["c > 1"]) == []
+    assert grid({"c": [1, 2], "a": []}, ["c > 1"]) == []
+
+
+def test_grid_generator_expression():
+    found = grid({"c": [0, 1, 2, 3]}, ["any(c > x for x in [1])"])
+    assert found == [{"c": 2}, {"c": 3}]
@@ -0,0 +1,63 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import os
+
+from utils.files import is_under, scan_tree
+
+
+def test_scan_tree(tmpdir):
+    tmpdir.join("a", "x.out").write("", ensure=True)
+    tmpdir.join("a", "b", "y.out").write("", ensure=True)
+    tmpdir.join("a", "b", "y.err").write("", ensure=True)
+    root = str(tmpdir.join("a"))
+    assert scan_tree(root, ".out") == set(
+        [os.path.join(root, "x.out"), os.path.join(root, "b", "y.out")]
+    )
+    assert scan_tree(str(tmpdir.join("missing")), ".out") == set()
+
+
+def test_scan_tree_symlinks(tmpdir):
+    tmpdir.join("real", "x.out").write("", ensure=True)
+    tmpdir.join("out").ensure(dir=True)
+    # Working dir linked in the out dir, and a link back to the out dir
+    os.symlink(str(tmpdir.join("real")), str(tmpdir.join("out", "wd")))
+    os.symlink(str(tmpdir.join("out")), str(tmpdir.join("out", "wd", "loop")))
+    found = scan_tree(str(tmpdir.join("out")), ".out")
+    # The loop is not followed
+    assert os.path.join(str(tmpdir), "out", "wd", "x.out") in found
+    assert len(found) == 1
+
+
+def test_is_under(tmpdir):
+    out_dir = str(tmpdir.join("out"))
+    assert is_under(os.path.join(out_dir, "wd", "x.out"), out_dir)
+    assert not is_under(os.path.join(out_dir, "..", "wd", "x.out"), out_dir)
+    assert not is_under("/elsewhere/x.out", out_dir)
+    assert not is_under(out_dir + "2/x.out", out_dir)
@@ -0,0 +1,124 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import json
+import os
+import sys
+
+from core.samplers import SuccessiveHalvingSampler
+
+JOB = """
+results = {}
+
+
+class Job(object):
+    def __init__(self, param_set):
+        self.param_set = param_set
+
+    def is_executed(self):
+        return self.key() in results
+
+    def key(self):
+        return (self.param_set["x"], self.param_set["iters"])
+
+
+def job_factory(experiment, param_set, job_id, config):
+    yield Job(param_set)
+"""
+
+STATS = """
+from halving.job import results
+
+
+class Stats(object):
+    def __init__(self, job):
+        self.job = job
+
+    def get_stat(self, name):
+        return results[self.job.key()]
+"""
+
+
+def job_module(tmpdir, monkeypatch):
+    package = tmpdir.mkdir("halving")
+    package.join("__init__.py").write("")
+    package.join("job.py").write(JOB)
+    package.join("stats.py").write(STATS)
+    monkeypatch.syspath_prepend(str(tmpdir))
+    for name in ("halving", "halving.job", "halving.stats"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    import halving.job
+
+    return halving.job
+
+
+def sampler(tmpdir, module):
+    experiment = {
+        "params": {"x": list(range(9)), "iters": 0},
+        "sampler": {
+            "type": "SuccessiveHalvingSampler",
+            "budget": 9,
+            "resource": "iters",
+            "min_resource": 1,
+            "max_resource": 9,
+            "eta": 3,
+            "metric": "time",
+            "state": str(tmpdir.join("state", "rounds.json")),
+        },
+    }
+    return SuccessiveHalvingSampler(experiment, module, {})
+
+
+def test_sampling_has_no_side_effects(tmpdir, monkeypatch):
+    module = job_module(tmpdir, monkeypatch)
+    first = list(sampler(tmpdir, module).sample())
+    assert len(first) == 9
+    assert all(param_set["iters"] == 1 for param_set in first)
+    for param_set in first:
+        module.results[(param_set["x"], 1)] = param_set["x"]
+    # A complete round is not promoted nor saved by sampling
+    assert list(sampler(tmpdir, module).sample()) == first
+    assert not os.path.exists(str(tmpdir.join("state")))
+
+
+def test_promote_rounds(tmpdir, monkeypatch):
+    module = job_module(tmpdir, monkeypatch)
+    search = sampler(tmpdir, module)
+    search.promote()
+    assert list(search.sample()) == list(sampler(tmpdir, module).sample())
+
+    for x in range(9):
+        module.results[(x, 1)] = 10 - x
+    search = sampler(tmpdir, module)
+    search.promote()
+    with open(str(tmpdir.join("state", "rounds.json"))) as f:
+        rounds = json.load(f)["rounds"]
+    assert len(rounds) == 2
+    assert sorted(config["x"] for config in rounds[1]) == [6, 7, 8]
+    assert [p["iters"] for p in search.sample()] == [1] * 9 + [3] * 3
@@ -0,0 +1,140 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import subprocess
+
+import pytest
+
+from hosts import gridengine, slurm
+from hosts.gridengine import GridEngine
+from hosts.host import Host
+from hosts.slurm import Slurm
+
+
+class ArrayHost(Host):
+    """ Host submitting arrays of jobs to a queue it simulates """
+
+    def __init__(self, config, polls):
+        Host.__init__(self, config)
+        self.polls = polls
+        self.arrays = []
+
+    def run_jobs(self, jobs, budget=None):
+        arrays = self.group_arrays(jobs, lambda job: job % 2, 4, budget)
+        for array in arrays:
+            self.arrays.append((len(array), budget()))
+            for task, job in enumerate(array, 1):
+                yield job, "%d_%d" % (len(self.arrays), task)
+
+    def get_queued(self):
+        poll = self.polls.pop(0)
+        if isinstance(poll, Exception):
+            raise poll
+        return poll
+
+
+def test_group_arrays():
+    host = Host({})
+    arrays = list(host.group_arrays(range(7), lambda job: job % 2, 3))
+    assert arrays == [[0, 2, 4], [1, 3, 5], [6]]
+    arrays = list(host.group_arrays(range(7), lambda job: job % 2, 3, lambda: 2))
+    assert arrays == [[0], [1], [2], [3], [4], [5], [6]]
+
+
+def test_throttled_arrays_fit_the_queue():
+    failure = subprocess.CalledProcessError(1, "squeue")
+    # The queue empties after every poll, the first one fails
+    host = ArrayHost({"submit_backoff": 0}, [failure, set(), set(), set()])
+    submitted = list(host.run_jobs_throttled(range(12), 5, 0))
+    assert sorted(job for job, _ in submitted) == list(range(12))
+    for size, budget in host.arrays:
+        assert size <= budget
+    assert failure not in host.polls
+
+
+def test_throttle_counts_other_jobs():
+    # Jobs of other launches fill the queue, then two of them finish
+    host = ArrayHost({}, [set("abcde"), set("abc"), set(), set()])
+    submitted = list(host.run_jobs_throttled(range(4), 5, 0))
+    assert sorted(job for job, _ in submitted) == list(range(4))
+    assert host.arrays[0] == (1, 2)
+    for size, budget in host.arrays:
+        assert size <= budget
+    assert len(host.polls) == 1
+
+
+def test_queue_listing_retries_exhausted():
+    failure = subprocess.CalledProcessError(1, "squeue")
+    host = ArrayHost({"submit_retries": 1, "submit_backoff": 0}, [failure, failure])
+    with pytest.raises(subprocess.CalledProcessError):
+        list(host.run_jobs_throttled(range(12), 2, 0))
+
+
+def test_submit_retries(tmpdir):
+    counter = tmpdir.join("calls")
+    # Fails the first two calls
+    cmd = "echo x >> %s; [ $(wc -l < %s) -gt 2 ] && echo 'Submitted batch job 7'" % (
+        counter,
+        counter,
+    )
+    host = Host({"submit_backoff": 0})
+    assert host.submit(cmd).split()[-1] == "7"
+    host = Host({"submit_retries": 1, "submit_backoff": 0})
+    counter.write("")
+    with pytest.raises(subprocess.CalledProcessError):
+        host.submit(cmd)
+
+
+QSTAT = """job-ID  prior   name       user         state submit/start at     queue                          slots ja-task-ID
+-----------------------------------------------------------------------------------------------------------------
+    101 0.55500 a          user         r     01/10/2024 10:00:00 all.q@node1                        1
+    102 0.55500 array      user         r     01/10/2024 10:00:00 all.q@node2                        1 3
+    102 0.00000 array      user         qw    01/10/2024 09:59:00                                    1 4-8:2
+    103 0.00000 other      user         qw    01/10/2024 09:59:00                                    1 1,5
+"""
+
+
+def test_qstat_parsing(monkeypatch):
+    monkeypatch.setattr(gridengine.subprocess, "check_output", lambda *a, **k: QSTAT)
+    queued = GridEngine({}).get_queued()
+    assert queued == set(
+        ["101", "102", "102.3", "102.4", "102.6", "102.8", "103", "103.1", "103.5"]
+    )
+    monkeypatch.setattr(gridengine.subprocess, "check_output", lambda *a, **k: "")
+    assert GridEngine({}).get_queued() == set()
+
+
+def test_squeue_parsing(monkeypatch):
+    monkeypatch.setattr(
+        slurm.subprocess, "check_output", lambda *a, **k: "11\n12_1\n12_2\n"
+    )
+    assert Slurm({}).get_queued() == set(["11", "12_1", "12_2"])
+    assert Slurm({}).is_running("12_2")
+    assert not Slurm({}).is_running("12_3")
+    assert not Host({}).is_running("12_2")
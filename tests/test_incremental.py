@@ -0,0 +1,73 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+from conftest import FakeJob
+from results.incremental import RowStore
+
+
+def test_get_put_and_save(tmpdir):
+    path = str(tmpdir.join("out.csv.rows"))
+    store = RowStore(path, ["p", "time"])
+    assert store.get("a.out", [1, 2], "d") is None
+    store.put("a.out", [1, 2], "d", ["3"])
+    store.put("b.out", [1, 2], "d", ["4"])
+    store.save(set(["a.out"]))
+
+    loaded = RowStore(path, ["p", "time"])
+    assert loaded.get("a.out", [1, 2], "d") == ["3"]
+    assert loaded.get("b.out", [1, 2], "d") is None
+    # Outputs or stats commands changed
+    assert loaded.get("a.out", [1, 3], "d") is None
+    assert loaded.get("a.out", [1, 2], "e") is None
+
+
+def test_columns_change_discards(tmpdir):
+    path = str(tmpdir.join("out.csv.rows"))
+    store = RowStore(path, ["p", "time"])
+    store.put("a.out", [1, 2], "d", ["3"])
+    store.save()
+    assert RowStore(path, ["p", "time", "energy"]).rows == {}
+    assert RowStore(path, ["p", "time"]).rows != {}
+
+
+def test_corrupted_store(tmpdir):
+    path = tmpdir.join("out.csv.rows")
+    path.write("{\"rows\": ")
+    assert RowStore(str(path), ["p"]).rows == {}
+    path.write("{\"other\": 1}")
+    assert RowStore(str(path), ["p"]).rows == {}
+
+
+def test_digest():
+    exp = FakeJob(stats={"time": "grep time", "energy": {"regex": "J"}})
+    digest = RowStore.digest(exp, ["time", "energy"])
+    assert digest == RowStore.digest(exp, ["time", "energy"])
+    assert digest != RowStore.digest(exp, ["energy", "time"])
+    other = FakeJob(stats={"time": "grep Time", "energy": {"regex": "J"}})
+    assert digest != RowStore.digest(other, ["time", "energy"])
@@ -0,0 +1,56 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import subprocess
+
+from conftest import FakeJob
+from hosts.localhost import LocalHost
+
+
+def test_parallel_records_exit_status(tmpdir):
+    host = LocalHost({"parallel": True, "slots": 2})
+    jobs = [
+        FakeJob("ok", tmpdir, bin="true\n"),
+        FakeJob("fail", tmpdir, bin="exit 3\n"),
+        FakeJob("big", tmpdir, bin="sleep 0.1\n", slots=4),
+    ]
+    submitted = [job for job, _ in host.run_jobs(jobs)]
+    assert submitted == jobs
+    assert host.exit_status[jobs[0].get_job_script_path()] == 0
+    assert host.exit_status[jobs[1].get_job_script_path()] == 3
+    assert host.exit_status[jobs[2].get_job_script_path()] == 0
+
+
+def test_parallel_leaves_other_children_alone(tmpdir):
+    # A child that is not a job finishes while the jobs are waited for
+    other = subprocess.Popen(["sh", "-c", "exit 5"])
+    host = LocalHost({"parallel": True, "slots": 1})
+    jobs = [FakeJob("job%d" % i, tmpdir, bin="sleep 0.1\n") for i in range(3)]
+    list(host.run_jobs(jobs))
+    assert other.wait() == 5
@@ -0,0 +1,135 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import os
+import stat
+import subprocess
+
+from conftest import FakeJob
+from hosts.host import Host
+from hosts.slurm import Slurm
+from models.base.model import PackedJob, ShelfPackedJob
+
+
+def experiments(tmpdir, *specs):
+    """ Packed experiments writing their name, specs are (seconds, nodes, slots) """
+    return [
+        FakeJob("e%d" % i, tmpdir, **dict(zip(("seconds", "nodes", "slots"), spec)))
+        for i, spec in enumerate(specs)
+    ]
+
+
+def run(tmpdir, code):
+    # srun runs the command after its options
+    fake = tmpdir.join("bin", "srun")
+    fake.write(
+        "#!/bin/bash\necho \"$@\" >> %s\nshift 5\nexport STEP=$1\nexec \"$@\"\n"
+        % tmpdir.join("steps"),
+        ensure=True,
+    )
+    os.chmod(str(fake), stat.S_IRWXU)
+    env = dict(os.environ, PATH="%s:%s" % (tmpdir.join("bin"), os.environ["PATH"]))
+    subprocess.check_call(["bash", "-c", code], env=env)
+
+
+def test_concurrent_pack_steps(tmpdir):
+    exps = experiments(tmpdir, (60, 2, 8), (120, 1, 4), (30, 2, 8))
+    pack = PackedJob(0, exps, 0.0, 2, Slurm.step_launcher)
+    code = pack.get_cmd_line()
+    assert "srun -N 2 -n 8 --exclusive bash -c 'echo $EXP' > %s" % exps[0].get_stdout() in code
+    assert "srun -N 1 -n 4 --exclusive bash -c 'echo $EXP' > %s" % exps[1].get_stdout() in code
+    assert code.index(exps[1].get_stdout()) < code.index(exps[0].get_stdout())
+    assert pack.get_nodes() == 4
+    # 120 on one lane, 60 + 30 on the other
+    assert pack.get_wall_time() == "00:02:00"
+
+    run(tmpdir, code)
+    for exp in exps:
+        assert open(exp.get_stdout()).read() == exp.name + "\n"
+    steps = sorted(open(str(tmpdir.join("steps"))).read().splitlines())
+    assert steps == sorted(
+        "-N %d -n %d --exclusive bash -c echo $EXP" % (exp.nodes, exp.slots) for exp in exps
+    )
+
+
+def test_concurrent_pack_without_steps(tmpdir):
+    exps = experiments(tmpdir, (60, 2, 8), (120, 1, 4))
+    pack = PackedJob(0, exps, 0.0, 2, Host.step_launcher)
+    assert "srun" not in pack.get_cmd_line()
+    assert pack.get_nodes() == 2
+    assert pack.get_slots() == 16
+    run(tmpdir, pack.get_cmd_line())
+    assert open(exps[0].get_stdout()).read() == "e0\n"
+
+
+def test_sequential_pack(tmpdir):
+    exps = experiments(tmpdir, (60, 2), (120, 2))
+    pack = PackedJob(0, exps, 0.5, 1, Slurm.step_launcher)
+    assert "srun" not in pack.get_cmd_line()
+    assert "wait" not in pack.get_cmd_line()
+    assert pack.get_nodes() == 2
+    assert pack.get_wall_time() == "00:04:30"
+
+
+def test_shelf_pack_steps(tmpdir):
+    first = experiments(tmpdir, (60, 2, 8), (50, 1, 4), (40, 1, 2))
+    second = [FakeJob("wide", tmpdir, seconds=30, nodes=4, slots=16)]
+    pack = ShelfPackedJob(0, [first, second], 0.0, Slurm.step_launcher)
+    code = pack.get_cmd_line()
+    for exp in first + second:
+        step = "srun -N %d -n %d --exclusive bash -c 'echo $EXP' > %s" % (
+            exp.nodes,
+            exp.slots,
+            exp.get_stdout(),
+        )
+        assert step in code
+    # The wide experiment starts after the first shelf
+    assert code.index("wait") < code.index(second[0].get_stdout())
+    assert pack.get_nodes() == 4
+    assert pack.get_wall_time() == "00:01:30"
+
+    run(tmpdir, code)
+    for exp in first + second:
+        assert open(exp.get_stdout()).read() == exp.name + "\n"
+
+
+def test_multiline_bin_steps(tmpdir):
+    # Every line of the bin runs inside the step, as in example.json
+    bin = "cd %s;\necho $EXP $STEP $(pwd)" % tmpdir
+    exps = [FakeJob("e%d" % i, tmpdir, slots=2, bin=bin) for i in range(2)]
+    shelf = [FakeJob("s0", tmpdir, slots=2, bin=bin)]
+    for pack, packed in [
+        (PackedJob(0, exps, 0.0, 2, Slurm.step_launcher), exps),
+        (ShelfPackedJob(0, [shelf], 0.0, Slurm.step_launcher), shelf),
+    ]:
+        code = pack.get_cmd_line()
+        assert code.count("srun") == len(packed)
+        run(tmpdir, code)
+        for exp in packed:
+            assert open(exp.get_stdout()).read() == "%s bash %s\n" % (exp.name, tmpdir)
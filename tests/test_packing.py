@@ -0,0 +1,112 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+from conftest import FakeJob
+from core.batcher import Batcher
+from utils import walltime
+
+
+def batcher():
+    # The packers only look at the experiments
+    return Batcher.__new__(Batcher)
+
+
+def bin_pack(jobs, capacity, pack_size=None, width=1):
+    return batcher()._Batcher__bin_pack(jobs, capacity, pack_size, width)
+
+
+def shelf_pack(jobs, nodes, capacity=None, pack_size=None):
+    return batcher()._Batcher__shelf_pack(jobs, nodes, capacity, pack_size)
+
+
+def test_walltime_conversions():
+    assert walltime.to_seconds("01:02:03") == 3723
+    assert walltime.to_seconds("05:00") == 300
+    assert walltime.to_seconds("2-00:00:01") == 172801
+    assert walltime.to_seconds(42) == 42
+    assert walltime.to_string(3723) == "01:02:03"
+    assert walltime.to_string(172801) == "2-00:00:01"
+
+
+def test_bin_pack_capacity():
+    jobs = [
+        FakeJob(str(i), seconds=seconds)
+        for i, seconds in enumerate([50, 40, 30, 20, 10, 60])
+    ]
+    bins = bin_pack(jobs, 100)
+    # Best fit fills the 60 with the 40 and the 50 with the 30 and 20
+    assert [sorted(job.seconds for job in b) for b in bins] == [[40, 60], [20, 30, 50], [10]]
+    for b in bins:
+        assert sum(job.seconds for job in b) <= 100
+
+
+def test_bin_pack_long_experiment_alone():
+    jobs = [FakeJob("long", seconds=500), FakeJob("a", seconds=10), FakeJob("b", seconds=10)]
+    bins = bin_pack(jobs, 100)
+    assert [job.name for job in bins[0]] == ["long"]
+    assert sorted(job.name for job in bins[1]) == ["a", "b"]
+
+
+def test_bin_pack_size_and_width():
+    jobs = [FakeJob(str(i), seconds=10) for i in range(6)]
+    assert [len(b) for b in bin_pack(jobs, 100, pack_size=4)] == [4, 2]
+    # Two lanes of 100 seconds hold 4 experiments of 50
+    jobs = [FakeJob(str(i), seconds=50) for i in range(5)]
+    assert [len(b) for b in bin_pack(jobs, 100, width=2)] == [4, 1]
+
+
+def test_shelf_pack_nodes():
+    jobs = [
+        FakeJob("a", seconds=100, nodes=2),
+        FakeJob("b", seconds=90, nodes=2),
+        FakeJob("c", seconds=50, nodes=4),
+    ]
+    allocations = shelf_pack(jobs, 4)
+    assert len(allocations) == 1
+    names = [[job.name for job in shelf] for shelf in allocations[0]]
+    assert names == [["a", "b"], ["c"]]
+
+
+def test_shelf_pack_capacity_and_wide():
+    jobs = [
+        FakeJob("a", seconds=100, nodes=2),
+        FakeJob("b", seconds=50, nodes=4),
+        FakeJob("wide", seconds=10, nodes=8),
+    ]
+    allocations = shelf_pack(jobs, 4, capacity=120)
+    names = sorted(
+        [job.name for shelf in allocation for job in shelf] for allocation in allocations
+    )
+    assert names == [["a"], ["b"], ["wide"]]
+
+
+def test_shelf_pack_size():
+    jobs = [FakeJob(str(i), seconds=10) for i in range(5)]
+    allocations = shelf_pack(jobs, 8, pack_size=2)
+    assert [sum(len(shelf) for shelf in allocation) for allocation in allocations] == [2, 2, 1]
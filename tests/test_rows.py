@@ -0,0 +1,104 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import random
+from collections import OrderedDict
+
+import pytest
+
+from results.rows import RowBuilder
+
+
+def tree_rows(records):
+    """ Rows in the order of a tree of the key values, as the csv had """
+    tree = OrderedDict()
+    for key, values in records:
+        level = tree
+        for value in key[:-1]:
+            level = level.setdefault(value, OrderedDict())
+        level.setdefault(key[-1], []).extend(values)
+
+    def walk(level, prefix):
+        for value, child in level.items():
+            if type(child) is list:
+                yield prefix + (value,), child
+            else:
+                for row in walk(child, prefix + (value,)):
+                    yield row
+
+    return list(walk(tree, ()))
+
+
+def built_rows(records, spill_rows):
+    rows = RowBuilder(spill_rows)
+    for key, values in records:
+        rows.add(key, values)
+    try:
+        return list(rows)
+    finally:
+        rows.close()
+
+
+@pytest.mark.parametrize("spill_rows", [1, 3, 7, 1000])
+def test_tree_order(spill_rows):
+    generator = random.Random(spill_rows)
+    records = [
+        (
+            (
+                generator.choice(["b", "a", "c"]),
+                generator.choice([16, 2, 8]),
+                generator.randrange(5),
+            ),
+            [generator.random()],
+        )
+        for _ in range(300)
+    ]
+    assert built_rows(records, spill_rows) == tree_rows(records)
+
+
+def test_joined_values_keep_their_order():
+    records = [(("x", 1), [1]), (("y", 1), [2]), (("x", 1), [3, 4]), (("x", 0), [5])]
+    assert built_rows(records, 2) == [(("x", 1), [1, 3, 4]), (("x", 0), [5]), (("y", 1), [2])]
+
+
+def test_mixed_types():
+    records = [((1,), [1]), (("1",), [2]), ((None,), [3]), ((1.0,), [4]), ((2,), [5])]
+    assert built_rows(records, 2) == tree_rows(records)
+
+
+def test_iterate_twice_and_close():
+    rows = RowBuilder(2)
+    for i in range(5):
+        rows.add((i % 2, i), [i])
+    assert list(rows) == list(rows)
+    files = rows.runs + rows.files
+    assert files
+    rows.close()
+    assert all(f.closed for f in files)
+    assert list(RowBuilder()) == []
@@ -0,0 +1,88 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import pytest
+
+from conftest import FakeJob
+from core.runtime import RuntimeModel
+
+
+def run_job(params, bin="./app", model="base"):
+    """ Experiment with the attributes the runtime model reads """
+    name = "_".join("%s%s" % item for item in sorted(params.items()))
+    return FakeJob(name, "/runs" + bin[1:], params, bin=bin, model=model)
+
+
+def model(tmpdir, runs):
+    runtimes = RuntimeModel(str(tmpdir.join("history", "runtimes.json")))
+    for params, seconds in runs:
+        runtimes.record(run_job(params), seconds)
+    return runtimes
+
+
+def test_exact_match_median(tmpdir):
+    runtimes = model(tmpdir, [({"n": 1, "app": "a"}, 10), ({"n": 2, "app": "a"}, 50)])
+    runtimes.record(run_job({"n": 1, "app": "a"}, bin="./other"), 1000)
+    assert runtimes.predict(run_job({"n": 1, "app": "a"})) == 10
+    assert runtimes.knows(run_job({"n": 2, "app": "a"}))
+    assert runtimes.predict(run_job({"n": 1}, model="other")) is None
+
+
+def test_power_law_regression(tmpdir):
+    # t = 2 * n^2
+    runtimes = model(tmpdir, [({"n": n, "app": "a"}, 2.0 * n * n) for n in (1, 2, 4, 8)])
+    runtimes.record(run_job({"n": 3, "app": "b"}), 1.0)
+    assert runtimes.predict(run_job({"n": 16, "app": "a"})) == pytest.approx(512)
+
+
+def test_nearest_runs(tmpdir):
+    runtimes = model(
+        tmpdir, [({"n": 1, "app": "a"}, 10), ({"n": 100, "app": "b"}, 1000)]
+    )
+    seconds = runtimes.predict(run_job({"n": 2, "app": "a"}))
+    assert 10 <= seconds < 100
+
+
+def test_save_and_reload(tmpdir):
+    runtimes = model(tmpdir, [({"n": 1}, 10)])
+    runtimes.save()
+    loaded = RuntimeModel(str(tmpdir.join("history", "runtimes.json")))
+    assert loaded.predict(run_job({"n": 1})) == 10
+
+
+def test_record_keeps_groups(tmpdir):
+    runtimes = model(tmpdir, [({"n": 1}, 10)])
+    assert runtimes.predict(run_job({"n": 1})) == 10
+    groups = runtimes.groups
+    runtimes.record(run_job({"n": 2}), 20)
+    # The new run is added to the groups instead of refitting them
+    assert runtimes.groups is groups
+    assert runtimes.predict(run_job({"n": 2})) == 20
+    runtimes.record(run_job({"n": 2}), 30)
+    assert runtimes.predict(run_job({"n": 2})) == 30
@@ -0,0 +1,114 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import pytest
+
+from core.samplers import (
+    FractionalFactorialSampler,
+    GridSampler,
+    HaltonSampler,
+    LatinHypercubeSampler,
+    RandomSampler,
+    UnknownSampler,
+    get_sampler,
+)
+
+
+def experiment(params, sampler, constraints=()):
+    return {"params": params, "sampler": sampler, "constraints": list(constraints)}
+
+
+def sample(sampler_class, params, settings, constraints=()):
+    exp = experiment(params, settings, constraints)
+    return list(sampler_class(exp, None, {}).sample())
+
+
+@pytest.mark.parametrize(
+    "sampler_class", [RandomSampler, LatinHypercubeSampler, HaltonSampler]
+)
+def test_budget_samplers_distinct_and_reproducible(sampler_class):
+    params = {"a": list(range(10)), "b": list(range(10)), "c": "x"}
+    settings = {"budget": 20, "seed": 3}
+    found = sample(sampler_class, params, settings)
+    assert len(found) == 20
+    assert len(set(tuple(sorted(p.items())) for p in found)) == 20
+    assert all(p["c"] == "x" for p in found)
+    assert found == sample(sampler_class, params, settings)
+
+
+@pytest.mark.parametrize(
+    "sampler_class", [RandomSampler, LatinHypercubeSampler, HaltonSampler]
+)
+def test_budget_samplers_constraints(sampler_class):
+    params = {"a": list(range(6)), "b": list(range(6))}
+    found = sample(sampler_class, params, {"budget": 10}, ["a < b"])
+    assert len(found) == 10
+    assert all(p["a"] < p["b"] for p in found)
+
+
+def test_budget_covering_the_space():
+    params = {"a": [1, 2], "b": [1, 2, 3]}
+    found = sample(RandomSampler, params, {"budget": 100})
+    assert len(found) == 6
+
+
+def test_budget_gives_up_on_rejections():
+    params = {"a": list(range(100))}
+    found = sample(RandomSampler, params, {"budget": 5, "max_draws": 50}, ["a < 0"])
+    assert found == []
+
+
+def test_latin_hypercube_strata():
+    params = {"a": list(range(10)), "b": list(range(10))}
+    found = sample(LatinHypercubeSampler, params, {"budget": 10})
+    # Every stratum of every param is sampled once
+    assert sorted(p["a"] for p in found) == list(range(10))
+    assert sorted(p["b"] for p in found) == list(range(10))
+
+
+def test_fractional_factorial_balance():
+    params = dict((name, [0, 5, 1]) for name in "abcde")
+    found = sample(FractionalFactorialSampler, params, {"budget": 8})
+    assert len(found) == 8
+    for name in "abcde":
+        # Only the first and last values, each in half of the runs
+        assert sorted(p[name] for p in found) == [0] * 4 + [1] * 4
+
+
+def test_fractional_factorial_budget_too_small():
+    params = dict((name, [0, 1]) for name in "abcde")
+    with pytest.raises(ValueError):
+        sample(FractionalFactorialSampler, params, {"budget": 4})
+
+
+def test_get_sampler():
+    assert get_sampler({}) is GridSampler
+    assert get_sampler({"sampler": {"type": "HaltonSampler"}}) is HaltonSampler
+    with pytest.raises(UnknownSampler):
+        get_sampler({"sampler": {"type": "Constraints"}})
@@ -0,0 +1,105 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+from argparse import Namespace
+
+from conftest import FakeJob
+from results.CSVResults import Results
+from results.cache import StatsCache
+from results.incremental import RowStore
+
+
+def stats_job(tmpdir, name):
+    return FakeJob(name, tmpdir, stats={"time": "grep time", "energy": "grep energy"})
+
+
+class Config(object):
+    def __init__(self):
+        self.args = Namespace(
+            csv_incremental=True, csv_cache=None, csv_cache_size=None, csv_jobs=1
+        )
+        self.parsed = []
+        parsed = self.parsed
+
+        class Stats(object):
+            def __init__(self, exp):
+                parsed.append(exp.get_stdout())
+                self.exp = exp
+
+            def get_stat(self, stat):
+                return "%s-%s" % (stat, self.exp.get_stdout()[-5])
+
+        self.stats = Namespace(Stats=Stats)
+
+    def get_args(self):
+        return self.args
+
+    def get_model(self, name):
+        return self.stats
+
+
+def test_collect_only_stale_shared(tmpdir):
+    jobs = []
+    for name in "abc":
+        tmpdir.join(name + ".out").write(name)
+        jobs.append(stats_job(tmpdir, name))
+    a, b, c = jobs
+
+    first = str(tmpdir.join("first.csv"))
+    store = RowStore(first + ".rows", [["p"], ["time"]])
+    key = a.get_stdout()
+    store.put(key, StatsCache.fingerprint(key), RowStore.digest(a, ["time"]), ["1"])
+    store.save()
+
+    config = Config()
+    parsed = Results(config).collect(
+        [
+            ([a, b, c], ["p"], ["time"], first),
+            ([a, b], ["p"], ["energy"], str(tmpdir.join("second.csv"))),
+            ([c], ["p"], ["time"], str(tmpdir.join("third.csv"))),
+        ]
+    )
+    # a is fresh in the first output and b only parsed once, as the second needs it too
+    assert config.parsed == [b.get_stdout(), c.get_stdout()]
+    assert parsed == {
+        b.get_stdout(): {"time": "time-b", "energy": "energy-b"},
+        c.get_stdout(): {"time": "time-c"},
+    }
+
+
+def test_collect_without_store(tmpdir):
+    a, b = stats_job(tmpdir, "a"), stats_job(tmpdir, "b")
+    config = Config()
+    config.args.csv_incremental = False
+    parsed = Results(config).collect(
+        [([a, b], ["p"], ["time"], None), ([a], ["p"], ["energy"], None)]
+    )
+    # b is needed by a single output, which parses it itself
+    assert config.parsed == [a.get_stdout()]
+    assert parsed == {a.get_stdout(): {"time": "time-a", "energy": "energy-a"}}
@@ -0,0 +1,71 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import pytest
+
+from results.CSVResults import Results, stdcsv
+
+
+class Rows(object):
+    """ Collected rows as the sql step reads them """
+
+    def headers(self):
+        return ["app", "time"]
+
+    def rows(self):
+        return [["a", "10"], ["b", "20"]]
+
+
+def run_sql(query, extra_files):
+    results = Results(None)
+    return results._Results__run_sql(Rows(), "out.csv", query, extra_files)
+
+
+def test_stdlib_csv():
+    assert hasattr(stdcsv, "reader")
+    assert stdcsv.__file__ != __file__
+
+
+def test_extra_files_with_quoted_commas(tmpdir):
+    extra = tmpdir.join("apps.csv")
+    extra.write('app,desc,weight\na,"first, and best",2\nb,second,3\n')
+    headers, rows = run_sql(
+        "SELECT out.app, desc, time * weight FROM out JOIN apps USING (app) ORDER BY app",
+        [str(extra)],
+    )
+    assert headers == ["app", "desc", "time * weight"]
+    assert rows == [("a", "first, and best", 20), ("b", "second", 60)]
+
+
+def test_extra_files_with_wrong_widths(tmpdir):
+    extra = tmpdir.join("apps.csv")
+    extra.write("app,weight\na,2\nb,3,4\n")
+    with pytest.raises(ValueError) as error:
+        run_sql("SELECT * FROM apps", [str(extra)])
+    assert "apps.csv:3" in str(error.value)
@@ -0,0 +1,142 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import os
+import subprocess
+
+import pytest
+
+from conftest import FakeJob
+from core.state import ACTIVE_STATES, StateStore
+from hosts import slurm
+from hosts.gridengine import GridEngine
+from hosts.host import Host
+from hosts.slurm import Slurm
+
+
+def state_job(name):
+    """ Unpacked experiment as the state store sees it """
+    return FakeJob(name, "/out", {"name": name})
+
+
+def fake_slurm(monkeypatch, sacct, squeue=""):
+    def check_output(cmd, **kwargs):
+        if cmd.startswith("sacct"):
+            if sacct is None:
+                raise subprocess.CalledProcessError(1, cmd)
+            return sacct
+        return squeue
+
+    monkeypatch.setattr(slurm.subprocess, "check_output", check_output)
+
+
+def test_record_and_update(tmpdir):
+    store = StateStore(str(tmpdir.join("state.db")))
+    jobs = [state_job("a"), state_job("b"), state_job("c")]
+    store.record("1", jobs[0])
+    store.record("2", jobs[1])
+    store.record(None, jobs[2])
+    assert sorted(store.active_jobs()) == ["1", "2"]
+
+    store.update({"1": ("preempted", None, None), "2": ("completed", 0, 12.0)})
+    assert store.active_jobs() == ["1"]
+    experiments = store.get_experiments()
+    row = experiments[StateStore.experiment_hash(jobs[1])]
+    assert (row["state"], row["exit_code"], row["runtime"]) == ("completed", 0, 12.0)
+    states = store.get_states()
+    assert states[StateStore.experiment_hash(jobs[2])] == "finished"
+    transitions = store.db.execute("SELECT COUNT(*) FROM transitions").fetchone()[0]
+    assert transitions == 5
+    store.close()
+
+
+def test_active_states():
+    for state in ("requeued", "suspended", "completing", "configuring", "resizing"):
+        assert state in ACTIVE_STATES
+
+
+def test_default_path():
+    path = StateStore.default_path("Slurm", "mn5")
+    assert path == os.path.join("~", ".tizona", "state-Slurm-mn5.db")
+
+
+def test_cluster_names(monkeypatch):
+    config = "SLURM_VERSION = 23.02\nClusterName             = mn5\nMaxJobCount = 10\n"
+    monkeypatch.setattr(slurm.subprocess, "check_output", lambda cmd, **kwargs: config)
+    assert Slurm({}).get_cluster() == "mn5"
+    assert Slurm({"cluster": "other"}).get_cluster() == "other"
+    config = "SLURM_VERSION = 23.02\n"
+    with pytest.raises(ValueError):
+        Slurm({}).get_cluster()
+
+    monkeypatch.setenv("SGE_CLUSTER_NAME", "p6444")
+    assert GridEngine({}).get_cluster() == "p6444"
+    monkeypatch.delenv("SGE_CLUSTER_NAME")
+    with pytest.raises(ValueError):
+        GridEngine({}).get_cluster()
+    assert GridEngine({"cluster": "ge"}).get_cluster() == "ge"
+    assert Host({}).get_cluster()
+
+
+def test_sacct_parsing(monkeypatch):
+    fake_slurm(
+        monkeypatch,
+        "10|COMPLETED|0:0|61\n"
+        "11|CANCELLED by 1234|0:15|5\n"
+        "12|NODE_FAIL|1:0|\n"
+        "13_[2-4,7%2]|PENDING|0:0|0\n"
+        "13_1|RUNNING|0:0|30\n",
+    )
+    states = Slurm({}).get_states(["10", "11", "12", "13_1", "13_2", "13_7"])
+    assert states["10"] == ("completed", 0, 61.0)
+    assert states["11"] == ("cancelled", 0, 5.0)
+    assert states["12"] == ("failed", 1, None)
+    assert states["13_1"] == ("running", 0, 30.0)
+    assert states["13_3"] == ("pending", 0, 0.0)
+    assert states["13_7"] == ("pending", 0, 0.0)
+
+
+def test_jobs_missing_from_sacct(monkeypatch, tmpdir):
+    # Accounting lags behind or lost the jobs
+    fake_slurm(monkeypatch, "", "21\n")
+    states = Slurm({}).get_states(["20", "21"])
+    assert states == {"20": ("unknown", None, None), "21": ("queued", None, None)}
+
+    store = StateStore(str(tmpdir.join("state.db")))
+    store.record("20", state_job("a"))
+    store.record("21", state_job("b"))
+    store.update(states)
+    # The lost job is not in flight anymore, its output decides whether it runs again
+    assert store.active_jobs() == ["21"]
+
+
+def test_sacct_unavailable(monkeypatch):
+    fake_slurm(monkeypatch, None, "31\n")
+    states = Slurm({}).get_states(["30", "31"])
+    assert states == {"30": ("finished", None, None), "31": ("queued", None, None)}
@@ -0,0 +1,127 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import pytest
+
+from conftest import FakeJob
+from models.base.stats import Rule, Stats, scan
+
+
+OUTPUT = "Cycles 10\nIPC: 1.5\nTime: 3\nIPC: 2.5\ncycles 30\nTime: 5\n"
+
+
+def rules(**specs):
+    return dict((stat, Rule(spec)) for stat, spec in specs.items())
+
+
+def test_matches(tmpdir):
+    path = tmpdir.join("out")
+    path.write(OUTPUT)
+    values = scan(
+        str(path),
+        rules(
+            first={"regex": "^Time", "field": -1, "match": "first"},
+            last={"regex": "^Time", "field": -1},
+            all={"regex": "IPC: ([0-9.]+)", "match": "all"},
+            line={"regex": "^Cycles"},
+            missing={"regex": "^Energy"},
+        ),
+    )
+    assert values["first"] == ["3"]
+    assert values["last"] == ["5"]
+    assert values["all"] == ["1.5", "2.5"]
+    assert values["line"] == ["Cycles 10"]
+    assert values["missing"] == []
+
+
+def test_field_and_delimiter(tmpdir):
+    path = tmpdir.join("out")
+    path.write("time;1;2;3\nshort\n")
+    values = scan(
+        str(path),
+        rules(
+            second={"regex": "^time", "field": 2, "delimiter": ";"},
+            out_of_range={"regex": "^short", "field": 3},
+        ),
+    )
+    assert values["second"] == ["2"]
+    assert values["out_of_range"] == []
+
+
+def test_inline_flags(tmpdir):
+    path = tmpdir.join("out")
+    path.write(OUTPUT)
+    values = scan(
+        str(path),
+        rules(
+            cycles={"regex": "(?i)^cycles", "field": 1, "match": "all"},
+            time={"regex": "^Time", "field": -1},
+        ),
+    )
+    assert values["cycles"] == ["10", "30"]
+    assert values["time"] == ["5"]
+    assert scan(str(path), rules(alone={"regex": "(?i)ipc", "field": 1}))["alone"] == ["2.5"]
+
+
+def test_invalid_rules():
+    with pytest.raises(ValueError):
+        Rule({"regex": "("})
+    with pytest.raises(ValueError):
+        Rule({"regex": "a", "match": "middle"})
+
+
+def test_empty_file(tmpdir):
+    path = tmpdir.join("out")
+    path.write("")
+    assert scan(str(path), rules(time={"regex": "^Time"})) == {}
+
+
+def test_stats(tmpdir):
+    job = FakeJob(
+        directory=tmpdir,
+        stats={
+            "time": {"regex": "^Time", "field": -1, "match": "all"},
+            "ipc": {"regex": "(?i)^ipc: ([0-9.]+)"},
+            "log": {"regex": "^Cycles", "field": 1, "file": "%(working_dir)s/sim.log"},
+            "bash": "grep -c IPC %(stdout)s",
+        },
+    )
+    with open(job.get_stdout(), "w") as f:
+        f.write(OUTPUT)
+    stats = Stats(job)
+    assert stats.get_stat("time") == 4.0
+    assert stats.get_stat("ipc") == 2.5
+    assert stats.get_stat("bash") == 2.0
+    # Missing files give 0.0, as failed commands do
+    assert stats.get_stat("log") == 0.0
+
+    tmpdir.join("sim.log").write("Cycles 7\n")
+    assert Stats(job).get_stat("log") == 7.0
+    # Only the given stats are read
+    assert Stats(job, names=["ipc", "other"]).stats == {"ipc": ["2.5"]}
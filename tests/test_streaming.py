@@ -0,0 +1,86 @@
+# Copyright (c) 2017, Barcelona Supercomputing Center
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#
+# Authors: E. Castillo (Barcelona Supercomputing Center)
+
+import random
+
+from conftest import FakeJob
+from core.batcher import Batcher
+
+
+class Producer(object):
+    """ Counts the experiments taken from it """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.taken = 0
+
+    def __iter__(self):
+        for job in self.jobs:
+            self.taken += 1
+            yield job
+
+
+def batcher():
+    # The windowed steps only look at the experiments
+    return Batcher.__new__(Batcher)
+
+
+def jobs(count, values=3):
+    return [FakeJob("e%d" % i, params={"p": i % values}) for i in range(count)]
+
+
+def test_windowed_shuffle():
+    random.seed(1)
+    producer = Producer(jobs(100))
+    shuffled = []
+    for job in batcher()._Batcher__shuffle_experiments(producer, 10):
+        # The experiment yielded is the only one out of the buffer
+        assert producer.taken - len(shuffled) <= 10 + 1
+        shuffled.append(job)
+    assert sorted(shuffled, key=producer.jobs.index) == producer.jobs
+    assert shuffled != producer.jobs
+    # A window wider than the experiments shuffles them all
+    assert len(list(batcher()._Batcher__shuffle_experiments(jobs(5), 10))) == 5
+
+
+def test_windowed_grouping():
+    producer = Producer(jobs(100))
+    grouped = []
+    for part in batcher()._Batcher__group_exps(producer, ["p"], 4, 10):
+        assert producer.taken - len(grouped) <= 10
+        assert len(part) <= 4
+        assert len(set(job.get_param("p") for job in part)) == 1
+        grouped.extend(part)
+    assert sorted(grouped, key=producer.jobs.index) == producer.jobs
+
+
+def test_grouping_without_window():
+    parts = list(batcher()._Batcher__group_exps(jobs(10), ["p"], 3, None))
+    assert [len(part) for part in parts] == [3, 3, 3, 1]
+    assert [part[0].get_param("p") for part in parts] == [0, 1, 2, 0]
@@ -47,6 +47,61 @@ def eval_json_python(j_file):
             j_file[key] = eval(j_file[key][3:])
 
 
+def scan_tree(path, suffix=""):
+    """
+    Lists the files under path whose name ends with suffix
+    reading the directories with scandir
+
+    Symlinked directories are followed, except the ones pointing to
+    a directory of their own path so links to their parents do not loop
+
+    Args:
+        path (str) In   : root directory, missing directories are skipped
+        suffix (str) In : extension of the files to keep
+    Returns:
+        set : normalized paths of the files found
+    """
+    found = set()
+    try:
+        root = os.stat(path)
+    except OSError:
+        return found
+    # (directory, (device, inode) of it and its parents)
+    pending = [(path, frozenset([(root.st_dev, root.st_ino)]))]
+    while pending:
+        path, parents = pending.pop()
+        try:
+            entries = os.scandir(path)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir():
+                    try:
+                        info = entry.stat()
+                    except OSError:
+                        continue
+                    inode = (info.st_dev, info.st_ino)
+                    if inode not in parents:
+                        pending.append((entry.path, parents | set([inode])))
+                elif entry.name.endswith(suffix):
+                    found.add(os.path.normpath(entry.path))
+    return found
+
+
+def is_under(path, root):
+    """
+    Args:
+        path (str) In : file path
+        root (str) In : directory
+    Returns:
+        bool : True when path, once normalized, is inside root
+    """
+    path = os.path.abspath(path)
+    root = os.path.abspath(root)
+    return os.path.commonpath([path, root]) == root
+
+
 class cd:
     """
     Context manager for changing the current working directory
@@ -1,4 +1,7 @@
 import importlib
+import importlib.util
+import os
+import sys
 
 
 def load_module(module_string):
@@ -9,6 +12,19 @@ def load_module(module_string):
     return module
 
 
+def load_stdlib_module(module_string):
+    """
+    Loads a module of the standard library that a script of the repository
+    shadows, as csv.py shadows csv, without registering it in sys.modules
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = [entry for entry in sys.path if os.path.abspath(entry or ".") != root]
+    spec = importlib.machinery.PathFinder.find_spec(module_string, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
 def load_class(class_string):
     """
     class_string is the path to the class